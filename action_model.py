@@ -0,0 +1,287 @@
+"""板書アクションの型付きモデル
+
+アクションタイプごとに __slots__ を持つレコードクラスを用意し、読み込み時に
+ファイル全体を一度だけ検証・変換する。省略された項目の補完（time がなければ
+timestamp など）もここで済ませるため、描画・再生・保存では属性を直接参照する。
+
+to_dict() は従来の保存JSONと同じ形式の dict を返す。
+"""
+import math
+from dataclasses import dataclass, field, fields
+from typing import ClassVar
+
+from blackboard import GRID_WIDTH, GRID_HEIGHT
+
+ACTION_TYPES = ["書く", "消す（よける）", "線を引く", "囲う", "関連付ける", "貼る"]
+ERASE_TYPE = "消す（よける）"
+DIRECTIONS = ["横書き", "縦書き"]
+
+# 記録画面の初期値に合わせた既定値
+DEFAULT_COLORS = {"書く": "#FFFFFF", "線を引く": "#FFFFFF", "囲う": "#FFFF00", "関連付ける": "#FFD93D"}
+DEFAULTS = {
+    'content': "", 'direction': "横書き", 'size': 12, 'thickness': 2,
+    'bg_color': "#FFFFFF", 'border_color': "#000000", 'label': "",
+}
+
+COMMON_KEYS = ('action_id', 'type', 'time', 'timestamp')
+_MISSING = object()
+
+
+class ActionValidationError(ValueError):
+    """読み込んだ板書データの検証エラー
+
+    errors は (アクションの位置, キー, 内容) のリスト。位置はアクション以外の誤りでは None。
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        lines = [
+            f"{key}: {message}" if position is None else f"{position + 1}件目のアクション（{key}）: {message}"
+            for position, key, message in errors[:5]
+        ]
+        if len(errors) > 5:
+            lines.append(f"...他 {len(errors) - 5} 件")
+        super().__init__("\n".join(lines))
+
+
+@dataclass(slots=True)
+class Action:
+    """全アクション共通の項目"""
+    type: ClassVar[str] = ""
+    FIELDS: ClassVar[tuple] = ()  # タイプ固有の項目（保存JSONのキー順）
+
+    action_id: int
+    time: float
+    timestamp: int
+    # 保存JSONにある上記以外のキー（共同記録の記録者情報など）
+    extra: dict | None = field(default=None, kw_only=True)
+
+    def to_dict(self):
+        """保存JSONと同じ形式の dict"""
+        data = {'action_id': self.action_id, 'type': self.type}
+        for name in self.FIELDS:
+            data[name] = getattr(self, name)
+        data['time'] = self.time
+        data['timestamp'] = self.timestamp
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+
+@dataclass(slots=True)
+class WriteAction(Action):
+    """書く"""
+    type: ClassVar[str] = "書く"
+    content: str
+    start_x: int
+    start_y: int
+    end_x: int
+    end_y: int
+    direction: str
+    color: str
+    size: int
+
+
+@dataclass(slots=True)
+class EraseAction(Action):
+    """消す（よける）"""
+    type: ClassVar[str] = ERASE_TYPE
+    target_action_id: int
+
+
+@dataclass(slots=True)
+class LineAction(Action):
+    """線を引く"""
+    type: ClassVar[str] = "線を引く"
+    start_x: int
+    start_y: int
+    end_x: int
+    end_y: int
+    color: str
+    thickness: int
+
+
+@dataclass(slots=True)
+class EncloseAction(Action):
+    """囲う"""
+    type: ClassVar[str] = "囲う"
+    start_x: int
+    start_y: int
+    end_x: int
+    end_y: int
+    color: str
+
+
+@dataclass(slots=True)
+class RelateAction(Action):
+    """関連付ける"""
+    type: ClassVar[str] = "関連付ける"
+    start_x: int
+    start_y: int
+    end_x: int
+    end_y: int
+    color: str
+
+
+@dataclass(slots=True)
+class PasteAction(Action):
+    """貼る"""
+    type: ClassVar[str] = "貼る"
+    start_x: int
+    start_y: int
+    end_x: int
+    end_y: int
+    bg_color: str
+    border_color: str
+    label: str
+    image_id: str | None
+
+
+def _to_int(value, limit=None):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if type(value) is not int:  # True/False は除く
+        raise ValueError("整数で指定してください")
+    if limit is not None and not 0 <= value < limit:
+        raise ValueError(f"0〜{limit - 1}で指定してください")
+    return value
+
+
+def _to_x(value):
+    return _to_int(value, GRID_WIDTH)
+
+
+def _to_y(value):
+    return _to_int(value, GRID_HEIGHT)
+
+
+def _to_time(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError("数値で指定してください")
+    value = float(value)
+    if not math.isfinite(value) or value < 0:  # json.load は NaN / Infinity も読み込む
+        raise ValueError("0以上の有限の数値で指定してください")
+    return value
+
+
+def _to_str(value):
+    if not isinstance(value, str):
+        raise ValueError("文字列で指定してください")
+    return value
+
+
+def _to_direction(value):
+    if value not in DIRECTIONS:
+        raise ValueError("横書き/縦書きで指定してください")
+    return value
+
+
+def _to_image_id(value):
+    if value is not None and not isinstance(value, str):
+        raise ValueError("文字列で指定してください")
+    return value
+
+
+FIELD_CONVERTERS = {
+    'content': _to_str, 'label': _to_str,
+    'color': _to_str, 'bg_color': _to_str, 'border_color': _to_str,
+    'direction': _to_direction,
+    'start_x': _to_x, 'end_x': _to_x, 'start_y': _to_y, 'end_y': _to_y,
+    'size': _to_int, 'thickness': _to_int, 'target_action_id': _to_int,
+    'image_id': _to_image_id,
+}
+
+
+def _default(action_type, name):
+    if name == 'color':
+        return DEFAULT_COLORS.get(action_type, _MISSING)
+    if name == 'image_id':
+        return None
+    return DEFAULTS.get(name, _MISSING)
+
+
+ACTION_CLASSES = {}
+_FIELD_SPECS = {}  # クラス -> [(キー, 変換関数, 既定値), ...]
+_KNOWN_KEYS = {}   # クラス -> 保存JSONの既知のキー
+for _cls in (WriteAction, EraseAction, LineAction, EncloseAction, RelateAction, PasteAction):
+    _cls.FIELDS = tuple(f.name for f in fields(_cls) if f.name not in ('action_id', 'time', 'timestamp', 'extra'))
+    ACTION_CLASSES[_cls.type] = _cls
+    _FIELD_SPECS[_cls] = [(name, FIELD_CONVERTERS[name], _default(_cls.type, name)) for name in _cls.FIELDS]
+    _KNOWN_KEYS[_cls] = frozenset(COMMON_KEYS + _cls.FIELDS)
+
+
+def _convert(data, position, errors):
+    """1件の dict をアクションに変換（誤りは errors に追加して None を返す）"""
+    if not isinstance(data, dict):
+        errors.append((position, 'type', "アクションの形式が正しくありません"))
+        return None
+    cls = ACTION_CLASSES.get(data.get('type'))
+    if cls is None:
+        errors.append((position, 'type', "不明なアクションタイプです"))
+        return None
+
+    error_count = len(errors)
+    common = []
+    for name in ('action_id', 'timestamp'):
+        try:
+            common.append(_to_int(data.get(name, position)))
+        except ValueError as e:
+            errors.append((position, name, str(e)))
+    try:
+        # 古い形式では time がなく timestamp を時刻として使う
+        action_time = _to_time(data['time'] if 'time' in data else data.get('timestamp', position))
+    except ValueError as e:
+        errors.append((position, 'time', str(e)))
+
+    values = []
+    for name, convert, default in _FIELD_SPECS[cls]:
+        value = data.get(name, default)
+        if value is _MISSING:
+            errors.append((position, name, "ありません"))
+            continue
+        try:
+            values.append(convert(value))
+        except ValueError as e:
+            errors.append((position, name, str(e)))
+    if len(errors) > error_count:
+        return None
+
+    known = _KNOWN_KEYS[cls]
+    extra = None
+    if not data.keys() <= known:
+        extra = {key: value for key, value in data.items() if key not in known}
+    action_id, timestamp = common
+    return cls(action_id, action_time, timestamp, *values, extra=extra)
+
+
+def action_from_dict(data, position=0):
+    """保存JSON形式の dict を1件アクションに変換（action_id / timestamp が省略されていれば position）"""
+    errors = []
+    action = _convert(data, position, errors)
+    if errors:
+        raise ActionValidationError(errors)
+    return action
+
+
+def load_actions(raw_actions):
+    """保存JSONのアクション一覧をまとめて検証・変換（誤りがあれば全件分を ActionValidationError で報告）"""
+    if not isinstance(raw_actions, list):
+        raise ActionValidationError([(None, 'actions', "アクションの一覧がありません")])
+    errors = []
+    actions = [_convert(data, position, errors) for position, data in enumerate(raw_actions)]
+    if errors:
+        raise ActionValidationError(errors)
+    return actions
+
+
+def load_save_data(data):
+    """保存JSON（json.load の結果）から (アクション, 画像) を取り出す"""
+    if not isinstance(data, dict) or 'actions' not in data:
+        raise ActionValidationError([(None, 'actions', "アクションの一覧がありません")])
+    images = data.get('images', {})
+    if not isinstance(images, dict) or not all(
+        isinstance(info, dict) and isinstance(info.get('data'), str) and isinstance(info.get('type'), str)
+        for info in images.values()
+    ):
+        raise ActionValidationError([(None, 'images', "画像データの形式が正しくありません")])
+    return load_actions(data['actions']), images
@@ -0,0 +1 @@
+"""板書記録・再現システムのベンチマーク"""
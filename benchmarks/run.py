@@ -0,0 +1,234 @@
+"""板書記録・再現システムのベンチマーク
+
+使い方（リポジトリのルートで実行）:
+    python -m benchmarks.run
+    python -m benchmarks.run --sizes 100 1000 --repeat 5
+
+結果は benchmarks/history.jsonl に1回の実行につき1行で追記され、
+同じ環境（ホスト・CPUアーキテクチャ・Pythonのバージョン）の直近の記録の中央値と
+比べて閾値以上遅くなったベンチマーク（固定の基準処理との比で比較）があれば終了コード1を返す。
+"""
+import argparse
+import copy
+import gc
+import io
+import multiprocessing
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from action_model import load_save_data
+from blackboard import BoardTimeline, create_blackboard_html, dump_save_json, append_loaded_data, delete_action, delete_actions
+from benchmarks.synthetic import generate_lecture
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+DEFAULT_HISTORY = os.path.join(os.path.dirname(__file__), "history.jsonl")
+
+
+DEFAULT_BASELINE_RUNS = 5
+# 1回の計測でこの時間に達するまで繰り返し、1回あたりの平均を取る（短い処理のばらつき対策）
+MIN_SAMPLE_SECONDS = 0.05
+# 劣化の疑いがあるときに計測し直すプロセス数（プロセスごとのばらつき対策）
+RETRY_PROCESSES = 2
+
+
+def _measure(func, repeat, setup=None, min_time=MIN_SAMPLE_SECONDS):
+    """funcの1回あたりの実行時間（秒）をrepeat回計測し最小値を返す
+
+    timeit と同様に計測中はGCを止め、他の処理の影響が最も少ない回を採用する。
+    """
+    timings = []
+    for _ in range(repeat):
+        elapsed = 0.0
+        loops = 0
+        while loops == 0 or elapsed < min_time:
+            # setup（状態の複製など）は計測に含めない
+            arg = setup() if setup else None
+            gc.disable()
+            try:
+                start = time.perf_counter()
+                func(arg)
+                elapsed += time.perf_counter() - start
+            finally:
+                gc.enable()
+            loops += 1
+        timings.append(elapsed / loops)
+    return min(timings)
+
+
+def _reference_workload(_):
+    """計測環境の速さの目安にする固定の処理（文字列整形・辞書・JSON）"""
+    rows = [{'id': i, 'text': f"item{i}", 'x': i % 30, 'y': i % 10} for i in range(2000)]
+    json.dumps(rows, ensure_ascii=False)
+    return sorted(rows, key=lambda row: (row['y'], -row['id']))
+
+
+def run_benchmarks(sizes, repeat=3, render_samples=5, seed=0):
+    """各サイズの合成データで全ベンチマークを実行し ({名前: 秒}, {名前: 基準処理との比}) を返す
+
+    共有環境ではCPUの速さが数分単位で変わるため、各ベンチマークの直前に固定の
+    基準処理も計測し、その比を劣化の判定に使う。
+    """
+    results = {}
+    relative = {}
+    rng = random.Random(seed)
+
+    def record(name, func, setup=None, per=1):
+        reference = _measure(_reference_workload, repeat)
+        seconds = _measure(func, repeat, setup=setup) / per
+        results[name] = seconds
+        relative[name] = seconds / reference
+
+    for n in sizes:
+        lecture = generate_lecture(n, seed=seed)
+        actions, images = load_save_data(lecture)
+        max_time = max(action.time for action in actions)
+
+        # 描画（ランダムな再生時刻）
+        times = [rng.uniform(0, max_time) for _ in range(render_samples)]
+        record(f"render/{n}", lambda _: [create_blackboard_html(actions, t, images) for t in times],
+               per=render_samples)
+        record(f"timeline_build/{n}", lambda _: BoardTimeline(actions, images))
+        timeline = BoardTimeline(actions, images)
+        record(f"render_indexed/{n}", lambda _: [timeline.html_at(t) for t in times], per=render_samples)
+        record(f"render_full/{n}", lambda _: create_blackboard_html(actions, images=images))
+
+        # JSON保存・読み込み
+        json_str = json.dumps(lecture, ensure_ascii=False, indent=2)
+        record(f"save_json/{n}", lambda _: json.dumps(lecture, ensure_ascii=False, indent=2))
+        record(f"save_stream/{n}", lambda _: dump_save_json(actions, images, io.BytesIO()))
+        record(f"load_json/{n}", lambda _: json.loads(json_str))
+        record(f"load_validate/{n}", lambda _: load_save_data(json.loads(json_str)))
+
+        # 追加読み込み（同じサイズのデータを既存データに追加）
+        record(
+            f"append_merge/{n}",
+            lambda state: append_loaded_data(*state),
+            setup=lambda: (copy.deepcopy(actions), dict(images), *load_save_data(json.loads(json_str))),
+        )
+
+        # 削除（中央のアクション）
+        record(
+            f"delete/{n}",
+            lambda state: delete_action(state, len(state) // 2),
+            setup=lambda: copy.deepcopy(actions),
+        )
+
+        # まとめて削除（1割をランダムに選択）
+        batch = rng.sample(range(n), max(n // 10, 1))
+        record(
+            f"delete_batch/{n}",
+            lambda state: delete_actions(state, batch),
+            setup=lambda: copy.deepcopy(actions),
+        )
+
+    return results, relative
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path):
+    """これまでの実行結果を読み込む"""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _environment():
+    """計測結果を比べられる範囲（同じ環境の記録だけを基準にする）"""
+    return {
+        'host': platform.node(),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+    }
+
+
+def find_regressions(relative, history, threshold, environment=None, baseline_runs=DEFAULT_BASELINE_RUNS):
+    """同じ環境の直近baseline_runs回の中央値と比べてthreshold倍以上遅くなったベンチマークを返す
+
+    比較には基準処理との比（relative）を使う。戻り値は (名前, 以前の比, 今回の比)。
+    """
+    if environment is None:
+        environment = _environment()
+    matching = [
+        entry for entry in history
+        if 'relative' in entry and all(entry.get(key) == value for key, value in environment.items())
+    ]
+
+    regressions = []
+    for name, ratio in relative.items():
+        previous = [entry['relative'][name] for entry in matching if name in entry['relative']]
+        if not previous:
+            continue
+        before = statistics.median(previous[-baseline_runs:])
+        if ratio > before * threshold:
+            regressions.append((name, before, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="板書記録・再現システムのベンチマーク")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="アクション数")
+    parser.add_argument("--repeat", type=int, default=5, help="計測回数（最小値を採用）")
+    parser.add_argument("--history", default=DEFAULT_HISTORY, help="結果の履歴ファイル")
+    parser.add_argument("--threshold", type=float, default=1.25, help="劣化とみなす比率")
+    parser.add_argument("--baseline-runs", type=int, default=DEFAULT_BASELINE_RUNS,
+                        help="比較の基準にする同じ環境の直近の記録数（中央値を採用）")
+    parser.add_argument("--no-record", action="store_true", help="履歴に追記しない")
+    args = parser.parse_args(argv)
+
+    history = load_history(args.history)
+    results, relative = run_benchmarks(args.sizes, repeat=args.repeat)
+
+    for name, seconds in results.items():
+        print(f"{name:<24} {seconds * 1000:>12.3f} ms")
+
+    environment = _environment()
+    regressions = find_regressions(relative, history, args.threshold, environment, args.baseline_runs)
+    if regressions:
+        # 一時的な負荷やプロセスごとの差（ハッシュのシード・メモリ配置）による誤検出を避けるため、
+        # 劣化したサイズだけ別のプロセスで計測し直して最も速い結果を採用する
+        retry_sizes = sorted({int(name.rsplit("/", 1)[1]) for name, _, _ in regressions})
+        print(f"劣化の疑いがあるため再計測します（サイズ: {retry_sizes}）")
+        for _ in range(RETRY_PROCESSES):
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                retry_results, retry_relative = executor.submit(run_benchmarks, retry_sizes, args.repeat).result()
+            for name, ratio in retry_relative.items():
+                if ratio < relative[name]:
+                    results[name], relative[name] = retry_results[name], ratio
+        regressions = find_regressions(relative, history, args.threshold, environment, args.baseline_runs)
+    for name, before, after in regressions:
+        print(f"劣化: {name} 基準処理比 {before:.3f} -> {after:.3f} ({after / before:.2f}x, {results[name] * 1000:.3f} ms)")
+
+    if not args.no_record:
+        entry = {
+            'recorded_at': datetime.now().isoformat(),
+            'revision': _git_revision(),
+            **environment,
+            'results': results,
+            'relative': relative,
+        }
+        with open(args.history, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
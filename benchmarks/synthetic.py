@@ -0,0 +1,95 @@
+"""ベンチマーク用の合成授業データ生成"""
+import base64
+import random
+
+from action_model import load_actions
+from blackboard import GRID_WIDTH, GRID_HEIGHT, build_save_data
+
+ACTION_TYPES = ["書く", "消す（よける）", "線を引く", "囲う", "関連付ける", "貼る"]
+# 実際の授業に近い出現比率（書くが大半、貼るは少なめ）
+ACTION_WEIGHTS = [50, 10, 15, 10, 10, 5]
+
+SAMPLE_TEXTS = ["めあて", "まとめ", "分数", "比例", "三角形", "面積", "光合成", "江戸時代", "x + y = 10", "ふりかえり"]
+SAMPLE_COLORS = ["#FFFFFF", "#FFFF00", "#FF6B6B", "#4ECDC4", "#FFD93D"]
+
+
+def _random_coords(rng):
+    return (rng.randrange(GRID_WIDTH), rng.randrange(GRID_HEIGHT),
+            rng.randrange(GRID_WIDTH), rng.randrange(GRID_HEIGHT))
+
+
+def generate_images(count, image_bytes=2048, seed=0):
+    """ダミー画像データ（base64）を生成"""
+    rng = random.Random(seed)
+    images = {}
+    for i in range(count):
+        raw = bytes(rng.getrandbits(8) for _ in range(image_bytes))
+        images[f"image_{i}"] = {
+            'data': base64.b64encode(raw).decode(),
+            'type': 'image/png',
+            'name': f"material_{i}.png"
+        }
+    return images
+
+
+def generate_actions(n_actions, image_ids=(), seed=0):
+    """全アクションタイプを含む合成アクション列（保存JSON形式の dict）を生成"""
+    rng = random.Random(seed)
+    image_ids = list(image_ids)
+    actions = []
+    erasable = []  # 消去可能なaction_id
+    current_time = 0.0
+
+    for i in range(n_actions):
+        action_type = rng.choices(ACTION_TYPES, ACTION_WEIGHTS)[0]
+        if action_type == "消す（よける）" and not erasable:
+            action_type = "書く"
+        current_time = round(current_time + rng.uniform(0.5, 5.0), 1)
+        start_x, start_y, end_x, end_y = _random_coords(rng)
+
+        action = {'action_id': i, 'type': action_type}
+        if action_type == "書く":
+            action.update({
+                'content': rng.choice(SAMPLE_TEXTS),
+                'start_x': start_x, 'start_y': start_y, 'end_x': end_x, 'end_y': end_y,
+                'direction': rng.choice(["横書き", "縦書き"]),
+                'color': rng.choice(SAMPLE_COLORS),
+                'size': rng.randint(8, 24),
+            })
+        elif action_type == "消す（よける）":
+            target = erasable.pop(rng.randrange(len(erasable)))
+            action['target_action_id'] = target
+        elif action_type == "線を引く":
+            action.update({
+                'start_x': start_x, 'start_y': start_y, 'end_x': end_x, 'end_y': end_y,
+                'color': rng.choice(SAMPLE_COLORS),
+                'thickness': rng.randint(1, 10),
+            })
+        elif action_type in ("囲う", "関連付ける"):
+            action.update({
+                'start_x': start_x, 'start_y': start_y, 'end_x': end_x, 'end_y': end_y,
+                'color': rng.choice(SAMPLE_COLORS),
+            })
+        elif action_type == "貼る":
+            action.update({
+                'start_x': start_x, 'start_y': start_y, 'end_x': end_x, 'end_y': end_y,
+                'bg_color': "#FFFFFF",
+                'border_color': "#000000",
+                'label': f"プリント{i}",
+                'image_id': rng.choice(image_ids) if image_ids else None,
+            })
+        action['time'] = current_time
+        action['timestamp'] = i
+        actions.append(action)
+
+        if action_type != "消す（よける）":
+            erasable.append(i)
+
+    return actions
+
+
+def generate_lecture(n_actions, n_images=8, seed=0):
+    """保存ファイルと同じ形式の合成授業データを生成"""
+    images = generate_images(n_images, seed=seed)
+    actions = load_actions(generate_actions(n_actions, images.keys(), seed=seed))
+    return build_save_data(actions, images)
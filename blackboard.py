@@ -0,0 +1,461 @@
+"""板書データの描画・保存・読み込み処理
+
+Streamlitに依存しない処理をまとめたモジュール。アプリ本体（test00.py）と
+ベンチマーク（benchmarks/）の両方から利用する。
+
+アクションは action_model のレコード（読み込み時に検証済み）を受け取る。
+"""
+import json
+import math
+from bisect import bisect_right
+from datetime import datetime
+from functools import lru_cache
+
+# 黒板のグリッド設定
+GRID_WIDTH = 30
+GRID_HEIGHT = 10
+CELL_SIZE = 25  # 20から25に変更
+
+@lru_cache(maxsize=None)
+def board_open_html():
+    """黒板の枠・座標・グリッド線のHTML（閉じタグを除く）"""
+    html = f"""
+    <div style="position: relative; margin: 10px auto;">
+        <!-- 座標表示 -->
+        <div style="position: absolute; left: 0; top: -20px; font-size: 12px; color: #666;">
+            {"".join([f'<span style="position: absolute; left: {i * CELL_SIZE + 15}px;">{i}</span>' for i in range(0, GRID_WIDTH, 5)])}
+        </div>
+        <div style="position: absolute; left: -20px; top: 0; font-size: 12px; color: #666;">
+            {"".join([f'<span style="position: absolute; top: {i * CELL_SIZE + 10}px;">{i}</span>' for i in range(0, GRID_HEIGHT, 2)])}
+        </div>
+        
+        <!-- 黒板 -->
+        <div style="
+            width: {GRID_WIDTH * CELL_SIZE}px; 
+            height: {GRID_HEIGHT * CELL_SIZE}px; 
+            background-color: #2d5a2d; 
+            position: relative; 
+            border: 2px solid #fff;
+            margin-left: 25px;
+            margin-top: 25px;
+        ">
+    """
+    
+    # グリッド線を描画
+    for i in range(GRID_WIDTH + 1):
+        html += f"""
+        <div style="
+            position: absolute; 
+            left: {i * CELL_SIZE}px; 
+            top: 0; 
+            width: 1px; 
+            height: {GRID_HEIGHT * CELL_SIZE}px; 
+            background-color: rgba(255,255,255,0.1);
+        "></div>
+        """
+    
+    for i in range(GRID_HEIGHT + 1):
+        html += f"""
+        <div style="
+            position: absolute; 
+            left: 0; 
+            top: {i * CELL_SIZE}px; 
+            width: {GRID_WIDTH * CELL_SIZE}px; 
+            height: 1px; 
+            background-color: rgba(255,255,255,0.1);
+        "></div>
+        """
+    return html
+
+def render_action_html(action, images):
+    """1つのアクション（消す以外）のHTMLを生成"""
+    html = ""
+    if action.type == '書く':
+        # 文字の描画
+        start_x = action.start_x * CELL_SIZE + CELL_SIZE // 2
+        start_y = action.start_y * CELL_SIZE + CELL_SIZE // 2
+        end_x = action.end_x * CELL_SIZE + CELL_SIZE // 2
+        end_y = action.end_y * CELL_SIZE + CELL_SIZE // 2
+        
+        # 書き順の線を描画
+        html += f"""
+        <svg style="position: absolute; top: 0; left: 0; width: 100%; height: 100%; pointer-events: none;">
+            <line x1="{start_x}" y1="{start_y}" x2="{end_x}" y2="{end_y}" 
+                  stroke="rgba(255,255,255,0.3)" stroke-width="1" stroke-dasharray="2,2"/>
+        </svg>
+        """
+        
+        # 文字の配置計算
+        if action.direction == '横書き':
+            text_x = start_x
+            text_y = start_y
+            writing_mode = 'horizontal-tb'
+            text_orientation = 'mixed'
+        else:
+            text_x = start_x
+            text_y = start_y
+            writing_mode = 'vertical-rl'
+            text_orientation = 'upright'
+        
+        html += f"""
+        <div style="
+            position: absolute; 
+            left: {text_x - 10}px; 
+            top: {text_y - 10}px; 
+            color: {action.color}; 
+            font-size: {action.size}px;
+            font-weight: bold;
+            writing-mode: {writing_mode};
+            text-orientation: {text_orientation};
+            white-space: nowrap;
+            pointer-events: none;
+        ">{action.content}</div>
+        """
+        
+        # 開始点と終了点のマーカー
+        html += f"""
+        <div style="
+            position: absolute; 
+            left: {start_x - 3}px; 
+            top: {start_y - 3}px; 
+            width: 6px; 
+            height: 6px; 
+            background-color: #00ff00; 
+            border-radius: 50%;
+            border: 1px solid white;
+        " title="書き始め"></div>
+        <div style="
+            position: absolute; 
+            left: {end_x - 3}px; 
+            top: {end_y - 3}px; 
+            width: 6px; 
+            height: 6px; 
+            background-color: #ff0000; 
+            border-radius: 50%;
+            border: 1px solid white;
+        " title="書き終わり"></div>
+        """
+    
+    elif action.type == '線を引く':
+        start_x = action.start_x * CELL_SIZE + CELL_SIZE // 2
+        start_y = action.start_y * CELL_SIZE + CELL_SIZE // 2
+        end_x = action.end_x * CELL_SIZE + CELL_SIZE // 2
+        end_y = action.end_y * CELL_SIZE + CELL_SIZE // 2
+        
+        html += f"""
+        <svg style="position: absolute; top: 0; left: 0; width: 100%; height: 100%; pointer-events: none;">
+            <line x1="{start_x}" y1="{start_y}" x2="{end_x}" y2="{end_y}" 
+                  stroke="{action.color}" stroke-width="{action.thickness}"/>
+        </svg>
+        """
+    
+    elif action.type == '囲う':
+        start_x = action.start_x * CELL_SIZE
+        start_y = action.start_y * CELL_SIZE
+        end_x = action.end_x * CELL_SIZE
+        end_y = action.end_y * CELL_SIZE
+        
+        width = abs(end_x - start_x)
+        height = abs(end_y - start_y)
+        left = min(start_x, end_x)
+        top = min(start_y, end_y)
+        
+        html += f"""
+        <div style="
+            position: absolute; 
+            left: {left}px; 
+            top: {top}px; 
+            width: {width}px; 
+            height: {height}px; 
+            border: 2px solid {action.color}; 
+            border-radius: 5px;
+            pointer-events: none;
+        "></div>
+        """
+    
+    elif action.type == '関連付ける':
+        start_x = action.start_x * CELL_SIZE + CELL_SIZE // 2
+        start_y = action.start_y * CELL_SIZE + CELL_SIZE // 2
+        end_x = action.end_x * CELL_SIZE + CELL_SIZE // 2
+        end_y = action.end_y * CELL_SIZE + CELL_SIZE // 2
+        
+        # 矢印の計算
+        angle = math.atan2(end_y - start_y, end_x - start_x)
+        arrow_length = 10
+        arrow_angle = 0.5
+        
+        arrow_x1 = end_x - arrow_length * math.cos(angle - arrow_angle)
+        arrow_y1 = end_y - arrow_length * math.sin(angle - arrow_angle)
+        arrow_x2 = end_x - arrow_length * math.cos(angle + arrow_angle)
+        arrow_y2 = end_y - arrow_length * math.sin(angle + arrow_angle)
+        
+        html += f"""
+        <svg style="position: absolute; top: 0; left: 0; width: 100%; height: 100%; pointer-events: none;">
+            <line x1="{start_x}" y1="{start_y}" x2="{end_x}" y2="{end_y}" 
+                  stroke="{action.color}" stroke-width="2" stroke-dasharray="5,5"/>
+            <polygon points="{end_x},{end_y} {arrow_x1},{arrow_y1} {arrow_x2},{arrow_y2}" 
+                     fill="{action.color}"/>
+        </svg>
+        """
+    
+    elif action.type == '貼る':
+        start_x = action.start_x * CELL_SIZE
+        start_y = action.start_y * CELL_SIZE
+        end_x = action.end_x * CELL_SIZE
+        end_y = action.end_y * CELL_SIZE
+        
+        width = abs(end_x - start_x)
+        height = abs(end_y - start_y)
+        left = min(start_x, end_x)
+        top = min(start_y, end_y)
+        
+        # 画像がある場合は画像を表示、ない場合は白い四角
+        if action.image_id and action.image_id in images:
+            image_info = images[action.image_id]
+            image_data = image_info['data']
+            image_type = image_info['type']
+            
+            html += f"""
+            <div style="
+                position: absolute; 
+                left: {left}px; 
+                top: {top}px; 
+                width: {width}px; 
+                height: {height}px; 
+                border: 2px solid {action.border_color}; 
+                border-radius: 3px;
+                overflow: hidden;
+                pointer-events: none;
+            ">
+                <img src="data:{image_type};base64,{image_data}" 
+                     style="width: 100%; height: 100%; object-fit: cover;" 
+                     alt="{action.label}" />
+            </div>
+            """
+        else:
+            # 代替表示（白い四角）
+            html += f"""
+            <div style="
+                position: absolute; 
+                left: {left}px; 
+                top: {top}px; 
+                width: {width}px; 
+                height: {height}px; 
+                background-color: {action.bg_color}; 
+                border: 2px solid {action.border_color}; 
+                border-radius: 3px;
+                display: flex;
+                align-items: center;
+                justify-content: center;
+                font-size: 10px;
+                color: #666;
+                pointer-events: none;
+            ">{action.label}</div>
+            """
+    return html
+
+def create_blackboard_html(actions, current_time=None, images=None):
+    """黒板のHTMLを生成"""
+    if images is None:
+        images = {}
+    # 現在時刻までのアクションをフィルタリング
+    if current_time is not None:
+        filtered_actions = [action for action in actions if action.time <= current_time]
+    else:
+        filtered_actions = actions
+    
+    # 消去されたアクションIDを追跡
+    erased_action_ids = set()
+    for action in filtered_actions:
+        if action.type == '消す（よける）':
+            erased_action_ids.add(action.target_action_id)
+    
+    html = board_open_html()
+    
+    # アクションを描画（消去されていないもののみ）
+    for action in filtered_actions:
+        if action.type == '消す（よける）':
+            continue
+        if action.action_id in erased_action_ids:
+            continue
+        html += render_action_html(action, images)
+    
+    html += "</div></div>"
+    return html
+
+class BoardTimeline:
+    """任意の再生時刻の板書を求めるための索引
+
+    アクションごとのHTML断片と表示期間（書かれた時刻〜消された時刻）を最初に
+    一度だけ計算し、時刻ごとの問い合わせでは表示中の断片を並べるだけにする。
+    """
+
+    def __init__(self, actions, images=None):
+        if images is None:
+            images = {}
+        # 消去対象ごとに最初に消された時刻
+        erase_times = {}
+        for action in actions:
+            if action.type == '消す（よける）':
+                target = action.target_action_id
+                erase_times[target] = min(action.time, erase_times.get(target, math.inf))
+
+        # (表示開始時刻, 記録順, 消去時刻, HTML断片) を表示開始時刻順に並べる
+        entries = []
+        self._keys = {}  # 記録順 -> 要素のキー（action_id、重複時は記録順を付加）
+        used_keys = set()
+        for order, action in enumerate(actions):
+            if action.type == '消す（よける）':
+                continue
+            key = str(action.action_id)
+            if key in used_keys:
+                key = f"{key}#{order}"
+            used_keys.add(key)
+            self._keys[order] = key
+            entries.append((
+                action.time,
+                order,
+                erase_times.get(action.action_id),
+                render_action_html(action, images),
+            ))
+        entries.sort(key=lambda entry: (entry[0], entry[1]))
+        self._entries = entries
+        self._appear_times = [entry[0] for entry in entries]
+        self.max_time = max((action.time for action in actions), default=0)
+
+    def visible_items(self, current_time=None):
+        """current_time に表示されているアクションの (キー, 記録順, HTML断片)（記録順、None なら最終状態）"""
+        if current_time is None:
+            visible = [(order, fragment) for _, order, erased_at, fragment in self._entries
+                       if erased_at is None]
+        else:
+            end = bisect_right(self._appear_times, current_time)
+            visible = [(order, fragment) for _, order, erased_at, fragment in self._entries[:end]
+                       if erased_at is None or erased_at > current_time]
+        visible.sort()
+        return [(self._keys[order], order, fragment) for order, fragment in visible]
+
+    def visible_fragments(self, current_time=None):
+        """current_time に表示されているアクションのHTML断片（記録順）"""
+        return [fragment for _, _, fragment in self.visible_items(current_time)]
+
+    def html_at(self, current_time=None):
+        """current_time の黒板のHTML（create_blackboard_html と同じ内容）"""
+        return board_open_html() + "".join(self.visible_fragments(current_time)) + "</div></div>"
+
+def get_grid_coordinates():
+    """グリッド座標の選択肢を生成"""
+    coords = []
+    for y in range(GRID_HEIGHT):
+        for x in range(GRID_WIDTH):
+            coords.append(f"({x},{y})")
+    return coords
+
+def parse_coordinates(coord_str):
+    """座標文字列をパース"""
+    coord_str = coord_str.strip("()")
+    x, y = map(int, coord_str.split(","))
+    return x, y
+
+def build_save_data(actions, images):
+    """保存用のデータ構造を生成"""
+    return {
+        'actions': [action.to_dict() for action in actions],
+        'images': images,  # 画像データも保存
+        'metadata': {
+            'total_actions': len(actions),
+            'created_at': datetime.now().isoformat(),
+            'grid_size': f"{GRID_WIDTH}x{GRID_HEIGHT}",
+            'version': '2.0'  # バージョン情報を追加
+        }
+    }
+
+def iter_save_json(actions, images, chunk_size=64 * 1024):
+    """保存用JSONをUTF-8のバイト列チャンクとして順次生成"""
+    encoder = json.JSONEncoder(ensure_ascii=False, indent=2)
+    pending = []
+    pending_size = 0
+    for piece in encoder.iterencode(build_save_data(actions, images)):
+        pending.append(piece)
+        pending_size += len(piece)
+        if pending_size >= chunk_size:
+            yield "".join(pending).encode()
+            pending = []
+            pending_size = 0
+    if pending:
+        yield "".join(pending).encode()
+
+def dump_save_json(actions, images, fp):
+    """保存用JSONをバイナリファイルへ書き出す（全体の文字列は作らない）"""
+    for chunk in iter_save_json(actions, images):
+        fp.write(chunk)
+
+def append_loaded_data(actions, images, new_actions, new_images):
+    """読み込んだアクション・画像を現在のアクション・画像に追加（追加読み込み）"""
+    start = len(actions)
+    # action_idを調整して追加
+    new_ids = {}
+    for action in new_actions:
+        new_ids[action.action_id] = len(actions)
+        action.action_id = len(actions)
+        action.timestamp = len(actions)
+        actions.append(action)
+
+    # 画像データを追加（重複を避けるため新しいIDを生成）
+    new_image_ids = {}
+    for img_id, img_data in new_images.items():
+        new_img_id = f"imported_{img_id}_{len(images)}"
+        images[new_img_id] = img_data
+        new_image_ids[img_id] = new_img_id
+
+    # 消去アクションの対象ID・貼るの画像IDも新しいIDに付け替える
+    for action in actions[start:]:
+        if action.type == '消す（よける）':
+            action.target_action_id = new_ids.get(action.target_action_id, action.target_action_id)
+        elif action.type == '貼る' and action.image_id in new_image_ids:
+            action.image_id = new_image_ids[action.image_id]
+    return actions, images
+
+def delete_actions(actions, indices):
+    """指定位置のアクションをまとめて削除し、残りのアクションを返す
+
+    削除したアクションを対象とする消去アクションも取り除き、残ったアクションの
+    action_id を振り直す（消去アクションの対象IDも新しいIDに付け替える）。
+    """
+    indices = set(indices)
+    deleted_ids = {actions[i].action_id for i in indices}
+    kept = [
+        (i, act) for i, act in enumerate(actions)
+        if i not in indices
+        and not (act.type == '消す（よける）' and act.target_action_id in deleted_ids)
+    ]
+
+    # action_idを再割り当て
+    new_ids = {act.action_id: j for j, (_, act) in enumerate(kept)}
+    remaining = []
+    for j, (_, act) in enumerate(kept):
+        act.action_id = j
+        if act.type == '消す（よける）':
+            act.target_action_id = new_ids.get(act.target_action_id, act.target_action_id)
+        remaining.append(act)
+    return remaining
+
+def delete_action(actions, index):
+    """指定位置のアクションを削除し、残りのアクションを返す"""
+    return delete_actions(actions, [index])
+
+def describe_action(action):
+    """アクションの説明文（履歴表示用）"""
+    if action.type == '書く':
+        return f"文字「{action.content}」({action.start_x},{action.start_y})→({action.end_x},{action.end_y}) [{action.direction}]"
+    elif action.type == '消す（よける）':
+        return f"消去 (Action ID: {action.target_action_id})"
+    elif action.type == '線を引く':
+        return f"線 ({action.start_x},{action.start_y})→({action.end_x},{action.end_y})"
+    elif action.type == '囲う':
+        return f"囲み ({action.start_x},{action.start_y})→({action.end_x},{action.end_y})"
+    elif action.type == '関連付ける':
+        return f"関連付け ({action.start_x},{action.start_y})→({action.end_x},{action.end_y})"
+    elif action.type == '貼る':
+        return f"貼り付け「{action.label}」({action.start_x},{action.start_y})→({action.end_x},{action.end_y})"
+    return action.type
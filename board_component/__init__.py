@@ -0,0 +1,65 @@
+"""差分更新する板書コンポーネント
+
+st.components.v1.html は再実行のたびにiframe全体を作り直すため、
+ブラウザ側でアクションごとの要素をキー付きで保持するコンポーネントを使う。
+Python側は前回送った内容を覚えておき、追加・削除されたアクションだけを送る。
+ブラウザ側の状態が食い違った場合（再マウント等）は全体の再送を依頼してくる。
+"""
+import os
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+from blackboard import GRID_HEIGHT, CELL_SIZE, board_open_html
+
+BOARD_HEIGHT = GRID_HEIGHT * CELL_SIZE + 100
+
+_component = components.declare_component(
+    "blackboard_board",
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend"),
+)
+
+
+def board_frame_html():
+    """黒板の枠とアクションを入れる層のHTML"""
+    return board_open_html() + '<div class="actions-layer"></div>' + "</div></div>"
+
+
+def blackboard_board(items, key, height=BOARD_HEIGHT):
+    """板書を表示（前回から変わったアクションだけをブラウザに送る）
+
+    items は BoardTimeline.visible_items() が返す (キー, 記録順, HTML断片) のリスト。
+    """
+    state_key = f"_board_state_{key}"
+    state = st.session_state.get(state_key)
+    request = (st.session_state.get(key) or {}).get('request')
+
+    # 初回、またはブラウザから全体の再送を依頼されたとき
+    reset = state is None or request != state['handled_request']
+    if reset:
+        revision = state['revision'] if state is not None else 0
+        state = {'revision': revision, 'sent': {}, 'handled_request': request}
+
+    current = {item_key: (order, fragment) for item_key, order, fragment in items}
+    sent = state['sent']
+    removed = [item_key for item_key in sent if item_key not in current]
+    added = [[item_key, order, fragment] for item_key, (order, fragment) in current.items()
+             if sent.get(item_key) != (order, fragment)]
+
+    base_revision = state['revision']
+    if reset or added or removed:
+        state['revision'] += 1
+    state['sent'] = current
+    st.session_state[state_key] = state
+
+    _component(
+        key=key,
+        default=None,
+        revision=state['revision'],
+        base_revision=base_revision,
+        reset=reset,
+        frame=board_frame_html() if reset else None,
+        added=added,
+        removed=removed,
+        height=height,
+    )
@@ -0,0 +1,169 @@
+"""表計算ファイル（CSV/TSV/Excel .xlsx）からのアクション一括取り込み
+
+1行が1アクションに対応する。検証は列単位でまとめて行い（行ごとのループなし）、
+エラーは行番号付きの表として返す。
+
+列名は保存JSONのキーと同じ（type, time, start_x, ... ）。日本語の列名も使える。
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from action_model import ACTION_CLASSES, ACTION_TYPES, ERASE_TYPE, DEFAULT_COLORS, DEFAULTS
+from blackboard import GRID_WIDTH, GRID_HEIGHT
+
+# 日本語の列名 → 保存JSONのキー
+COLUMN_ALIASES = {
+    'タイプ': 'type', 'アクションタイプ': 'type',
+    '時間': 'time', '時刻': 'time',
+    '開始x': 'start_x', '開始y': 'start_y', '終了x': 'end_x', '終了y': 'end_y',
+    '内容': 'content', '文字': 'content',
+    '書字方向': 'direction', '色': 'color', '文字サイズ': 'size', '線の太さ': 'thickness',
+    '消去対象': 'target_action_id',
+    '背景色': 'bg_color', '枠線色': 'border_color', 'ラベル': 'label',
+}
+
+# アクションタイプごとに保存する列
+TYPE_FIELDS = {
+    "書く": ['content', 'start_x', 'start_y', 'end_x', 'end_y', 'direction', 'color', 'size'],
+    ERASE_TYPE: ['target_action_id'],
+    "線を引く": ['start_x', 'start_y', 'end_x', 'end_y', 'color', 'thickness'],
+    "囲う": ['start_x', 'start_y', 'end_x', 'end_y', 'color'],
+    "関連付ける": ['start_x', 'start_y', 'end_x', 'end_y', 'color'],
+    "貼る": ['start_x', 'start_y', 'end_x', 'end_y', 'bg_color', 'border_color', 'label'],
+}
+
+# 記録画面のスライダーと同じ範囲
+VALUE_RANGES = {'size': (8, 24), 'thickness': (1, 10)}
+
+COORD_COLUMNS = ['start_x', 'start_y', 'end_x', 'end_y']
+INT_COLUMNS = COORD_COLUMNS + ['size', 'thickness', 'target_action_id']
+COLOR_COLUMNS = ['color', 'bg_color', 'border_color']
+# 整数列として受け付ける絶対値の上限（Int64 に変換でき、float で正確に表せる範囲）
+MAX_INT_VALUE = 2 ** 53
+ALL_COLUMNS = ['type', 'time'] + sorted({f for fields in TYPE_FIELDS.values() for f in fields})
+
+
+def read_action_table(file, file_name):
+    """拡張子に応じてCSV/TSV/Excelを読み込む"""
+    ext = os.path.splitext(file_name)[1].lower()
+    if ext in ('.tsv', '.txt'):
+        df = pd.read_csv(file, sep='\t')
+    elif ext == '.xlsx':
+        # Excelの読み込みには openpyxl が必要（古い .xls 形式は対象外）
+        df = pd.read_excel(file)
+    else:
+        df = pd.read_csv(file)
+    df.columns = [COLUMN_ALIASES.get(str(c).strip(), str(c).strip()) for c in df.columns]
+    return df
+
+
+def _collect_errors(df, mask, column, message):
+    """maskがTrueの行をエラー表の形にする"""
+    rows = df.index[mask.to_numpy()]
+    return pd.DataFrame({'行': rows + 2, '列': column, '内容': message})  # 2 = ヘッダー行 + 1始まり
+
+
+def validate_action_table(df, existing_actions):
+    """表を一括検証し (既定値で補完した表, エラー表) を返す
+
+    消去対象のIDがファイル内の行の位置に依存するため、取り込みはエラーが
+    1件もないときだけ行う。ファイル内の行は 既存件数 + (データ行番号 - 1) のIDになる。
+    """
+    df = df.reset_index(drop=True).reindex(columns=ALL_COLUMNS)
+    errors = []
+
+    # タイプ
+    df['type'] = df['type'].astype('string').str.strip()
+    bad_type = ~df['type'].isin(ACTION_TYPES)
+    errors.append(_collect_errors(df, bad_type, 'type', "不明なアクションタイプ"))
+
+    # 時間
+    time_values = pd.to_numeric(df['time'], errors='coerce')
+    bad_time = ~np.isfinite(time_values) | (time_values < 0)  # 欠損・inf も含む
+    errors.append(_collect_errors(df, bad_time, 'time', "時間は0以上の有限の数値で指定してください"))
+    df['time'] = time_values
+
+    # 文字列列
+    for column in ('content', 'direction', 'label'):
+        df[column] = df[column].astype('string')
+
+    # 整数列（座標・サイズ・消去対象）
+    provided = df[INT_COLUMNS].notna()
+    for column in INT_COLUMNS:
+        numeric = pd.to_numeric(df[column], errors='coerce')
+        # inf や巨大な値は Int64 に変換できないので整数でないものとして扱う
+        not_int = numeric.notna() & (~np.isfinite(numeric) | (numeric.abs() >= MAX_INT_VALUE)
+                                     | (numeric != np.floor(numeric)))
+        errors.append(_collect_errors(df, not_int | (df[column].notna() & numeric.isna()), column, "整数で指定してください"))
+        df[column] = numeric.where(~not_int).astype('Int64')
+
+    # 座標（消す以外は必須、グリッド内）
+    needs_coords = ~df['type'].isin([ERASE_TYPE]) & ~bad_type
+    for column, limit in (('start_x', GRID_WIDTH), ('end_x', GRID_WIDTH),
+                          ('start_y', GRID_HEIGHT), ('end_y', GRID_HEIGHT)):
+        values = df[column]
+        missing = needs_coords & ~provided[column]
+        out_of_grid = needs_coords & values.notna() & ((values < 0) | (values >= limit))
+        errors.append(_collect_errors(df, missing, column, "座標がありません"))
+        errors.append(_collect_errors(df, out_of_grid.fillna(False), column, f"座標は0〜{limit - 1}で指定してください"))
+
+    # 文字サイズ・線の太さ
+    for column, (low, high) in VALUE_RANGES.items():
+        values = df[column]
+        out_of_range = values.notna() & ((values < low) | (values > high))
+        errors.append(_collect_errors(df, out_of_range.fillna(False), column, f"{low}〜{high}で指定してください"))
+
+    # 書く：文字が必須
+    is_write = df['type'] == "書く"
+    no_content = is_write & (df['content'].isna() | (df['content'].str.strip() == ""))
+    errors.append(_collect_errors(df, no_content.fillna(False), 'content', "書き込む文字がありません"))
+    bad_direction = is_write & df['direction'].notna() & ~df['direction'].isin(["横書き", "縦書き"])
+    errors.append(_collect_errors(df, bad_direction.fillna(False), 'direction', "書字方向は横書き/縦書きで指定してください"))
+
+    # 色（#RRGGBB）
+    for column in COLOR_COLUMNS:
+        values = df[column].astype('string').str.strip()
+        bad_color = values.notna() & ~values.str.fullmatch(r"#[0-9A-Fa-f]{6}").fillna(False)
+        errors.append(_collect_errors(df, bad_color, column, "色は#RRGGBB形式で指定してください"))
+        df[column] = values
+
+    # 消去対象：既存またはファイル内で先に出てくる、消す以外のアクション
+    start_id = len(existing_actions)
+    new_ids = pd.Series(np.arange(start_id, start_id + len(df)), index=df.index)
+    erasable_existing = {a.action_id for a in existing_actions if a.type != ERASE_TYPE}
+    is_erase = df['type'] == ERASE_TYPE
+    target = df['target_action_id']
+    new_erasable = new_ids[~is_erase & ~bad_type]
+    target_in_file = target.isin(new_erasable.to_numpy()) & (target < new_ids)
+    valid_target = target.isin(list(erasable_existing)) | target_in_file
+    bad_target = is_erase & ~valid_target.fillna(False)
+    errors.append(_collect_errors(df, bad_target.fillna(False), 'target_action_id', "消去対象のアクションIDが見つかりません"))
+
+    error_table = pd.concat(errors, ignore_index=True).sort_values('行', kind='stable').reset_index(drop=True)
+
+    # 既定値で補完
+    for column, default in DEFAULTS.items():
+        df[column] = df[column].fillna(default)
+    df['color'] = df['color'].fillna(df['type'].map(DEFAULT_COLORS))
+    return df, error_table
+
+
+def table_to_actions(df, start_id):
+    """検証済みの表をアクションのリストに変換"""
+    df = df.reset_index(drop=True)
+    ids = range(start_id, start_id + len(df))
+    records = [None] * len(df)
+    for action_type, group in df.groupby('type', sort=False):
+        cls = ACTION_CLASSES[action_type]
+        fields = TYPE_FIELDS[action_type]
+        # pandasの型をJSONに保存できるPythonの型に戻す
+        columns = group[fields].astype(object)
+        columns = columns.where(columns.notna(), None)
+        times = group['time'].astype(float).tolist()
+        for position, values, action_time in zip(group.index, columns.to_dict('records'), times):
+            if action_type == "貼る":
+                values['image_id'] = None
+            records[position] = cls(ids[position], action_time, ids[position], **values)
+    return records
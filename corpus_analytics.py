@@ -0,0 +1,248 @@
+"""板書記録アーカイブの集計
+
+ディレクトリ内の板書データ（JSON）を順に読み、ファイルごとの指標を
+プロセスプールで並列に計算する。結果はファイル内容のハッシュをキーに
+キャッシュするため、再実行時は新しいファイル（内容が変わったファイル）だけを処理する。
+
+使い方（リポジトリのルートで実行）:
+    python -m corpus_analytics recordings/ --out analytics_out/
+
+指標:
+    - 黒板の領域ごとの使用回数（ヒートマップ）
+    - 1分あたりの書字数・消去数
+    - 縦書き／横書きの比率
+    - 貼ってから、その範囲に書き込み・線・囲み・関連付けをするまでの時間
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from action_model import ERASE_TYPE, load_save_data
+from blackboard import GRID_WIDTH, GRID_HEIGHT
+
+# 指標の計算方法を変えたら上げる（古いキャッシュを使わないため）
+METRICS_VERSION = 2
+DEFAULT_CACHE_DIR = ".analytics_cache"
+
+ANNOTATION_TYPES = ["書く", "線を引く", "囲う", "関連付ける"]
+# 貼る×注記の重なり判定で一度に作る行列の上限（要素数）
+MAX_OVERLAP_CELLS = 1_000_000
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """ファイル内容のSHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_recordings(directory):
+    """ディレクトリ内の板書データ（*.json）のパスを名前順に返す"""
+    with os.scandir(directory) as entries:
+        names = sorted(entry.name for entry in entries if entry.is_file() and entry.name.endswith('.json'))
+    for name in names:
+        yield os.path.join(directory, name)
+
+
+def _first_annotation_delays(paste, note, times, x0, x1, y0, y1):
+    """各「貼る」から、その範囲に重なる最初の注記までの時間
+
+    貼る×注記の総当たりを一括計算する。行列が大きくなりすぎないよう貼るを分割して処理する。
+    """
+    delays = []
+    chunk = max(1, MAX_OVERLAP_CELLS // len(note))
+    n = note[None, :]
+    for begin in range(0, len(paste), chunk):
+        p = paste[begin:begin + chunk, None]
+        overlaps = ((x0[n] <= x1[p]) & (x1[n] >= x0[p])
+                    & (y0[n] <= y1[p]) & (y1[n] >= y0[p])
+                    & (times[n] >= times[p]))
+        first = np.where(overlaps, times[n] - times[p], np.inf).min(axis=1)
+        delays.append(first[np.isfinite(first)])
+    return np.concatenate(delays)
+
+
+def compute_metrics(actions):
+    """1つの授業のアクション（action_model のレコード）から指標を計算"""
+    n_actions = len(actions)
+    types = np.array([action.type for action in actions], dtype=object)
+    times = np.fromiter((action.time for action in actions), dtype=float, count=n_actions)
+    is_write = types == "書く"
+    is_erase = types == ERASE_TYPE
+
+    # 範囲（始点と終点を含む矩形）。消すには範囲がないので空の矩形にしておく
+    boxes = np.array(
+        [(0, 0, 0, 0) if action.type == ERASE_TYPE else (action.start_x, action.start_y, action.end_x, action.end_y)
+         for action in actions],
+        dtype=np.int64,
+    ).reshape(-1, 4)
+    x0 = np.minimum(boxes[:, 0], boxes[:, 2])
+    x1 = np.maximum(boxes[:, 0], boxes[:, 2])
+    y0 = np.minimum(boxes[:, 1], boxes[:, 3])
+    y1 = np.maximum(boxes[:, 1], boxes[:, 3])
+
+    # 領域ごとの使用回数：各アクションの範囲を二次元の差分配列で加算
+    drawn = ~is_erase
+    diff = np.zeros((GRID_HEIGHT + 1, GRID_WIDTH + 1), dtype=np.int64)
+    np.add.at(diff, (y0[drawn], x0[drawn]), 1)
+    np.add.at(diff, (y0[drawn], x1[drawn] + 1), -1)
+    np.add.at(diff, (y1[drawn] + 1, x0[drawn]), -1)
+    np.add.at(diff, (y1[drawn] + 1, x1[drawn] + 1), 1)
+    heatmap = diff.cumsum(axis=0).cumsum(axis=1)[:GRID_HEIGHT, :GRID_WIDTH]
+
+    # 1分ごとの書字数・消去数
+    minutes = (times // 60).astype(int)
+    n_minutes = int(minutes.max()) + 1 if n_actions else 0
+    writes_per_minute = np.bincount(minutes[is_write], minlength=n_minutes)
+    erases_per_minute = np.bincount(minutes[is_erase], minlength=n_minutes)
+
+    # 縦書き／横書き
+    vertical = sum(1 for action in actions if action.type == "書く" and action.direction == "縦書き")
+
+    # 貼ってから、その範囲に重なる最初の書き込み等までの時間
+    paste = np.flatnonzero(types == "貼る")
+    note = np.flatnonzero(np.isin(types, ANNOTATION_TYPES))
+    delays = np.zeros(0)
+    if len(paste) and len(note):
+        delays = _first_annotation_delays(paste, note, times, x0, x1, y0, y1)
+
+    return {
+        'actions': n_actions,
+        'duration': float(times.max()) if n_actions else 0.0,
+        'heatmap': heatmap.tolist(),
+        'writes_per_minute': writes_per_minute.tolist(),
+        'erases_per_minute': erases_per_minute.tolist(),
+        'horizontal': int(is_write.sum()) - vertical,
+        'vertical': vertical,
+        'paste_annotation_delays': delays.tolist(),
+    }
+
+
+def analyze_recording(path):
+    """1つの板書データファイルの指標（プロセスプールで実行）
+
+    読み込めないファイルは例外を投げずに {'error': 内容} を返し、他のファイルの処理を続ける。
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            actions, _ = load_save_data(json.load(f))
+        return compute_metrics(actions)
+    except Exception as e:  # 1ファイルの不備でアーカイブ全体の集計を止めない
+        return {'error': f"{type(e).__name__}: {e}"}
+
+
+def _cache_path(cache_dir, digest):
+    return os.path.join(cache_dir, f"{digest}-v{METRICS_VERSION}.json")
+
+
+def _write_cache(cache_dir, digest, metrics):
+    path = _cache_path(cache_dir, digest)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(metrics, f)
+    os.replace(tmp_path, path)
+
+
+def analyze_corpus(directory, cache_dir=DEFAULT_CACHE_DIR, workers=None):
+    """ディレクトリ内の全板書データを集計し ({ファイル名: 指標}, {ファイル名: エラー内容}, 新規に処理した数) を返す
+
+    キャッシュにないファイルだけをプロセスプールで処理し、終わったものから順にキャッシュする。
+    読み込めなかったファイルの結果（エラー）もキャッシュする（内容が変われば再処理される）。
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    results = {}
+    pending = []  # (ファイル名, パス, ハッシュ)
+    for path in iter_recordings(directory):
+        name = os.path.basename(path)
+        digest = file_hash(path)
+        cached = _cache_path(cache_dir, digest)
+        if os.path.exists(cached):
+            with open(cached, encoding='utf-8') as f:
+                results[name] = json.load(f)
+        else:
+            pending.append((name, path, digest))
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(analyze_recording, path): (name, digest) for name, path, digest in pending}
+            for future in as_completed(futures):
+                name, digest = futures[future]
+                metrics = future.result()
+                _write_cache(cache_dir, digest, metrics)
+                results[name] = metrics
+
+    results = dict(sorted(results.items()))
+    errors = {name: metrics['error'] for name, metrics in results.items() if 'error' in metrics}
+    metrics = {name: metrics for name, metrics in results.items() if 'error' not in metrics}
+    return metrics, errors, len(pending)
+
+
+def summarize(results):
+    """授業ごとの一覧、全体のヒートマップ、1分ごとの平均書字数・消去数を返す"""
+    rows = []
+    for name, metrics in results.items():
+        writes = sum(metrics['writes_per_minute'])
+        erases = sum(metrics['erases_per_minute'])
+        minutes = max(len(metrics['writes_per_minute']), 1)
+        directed = metrics['horizontal'] + metrics['vertical']
+        delays = metrics['paste_annotation_delays']
+        rows.append({
+            'ファイル': name,
+            'アクション数': metrics['actions'],
+            '授業時間（分）': metrics['duration'] / 60,
+            '書字数／分': writes / minutes,
+            '消去数／分': erases / minutes,
+            '消去の割合': erases / metrics['actions'] if metrics['actions'] else 0.0,
+            '縦書きの割合': metrics['vertical'] / directed if directed else np.nan,
+            '貼る→注記（秒、中央値）': float(np.median(delays)) if delays else np.nan,
+        })
+    summary = pd.DataFrame(rows)
+
+    heatmap = np.zeros((GRID_HEIGHT, GRID_WIDTH), dtype=np.int64)
+    for metrics in results.values():
+        heatmap += np.asarray(metrics['heatmap'], dtype=np.int64)
+    heatmap = pd.DataFrame(heatmap)
+
+    rates = pd.DataFrame({
+        '書字数': pd.DataFrame([m['writes_per_minute'] for m in results.values()]).mean(),
+        '消去数': pd.DataFrame([m['erases_per_minute'] for m in results.values()]).mean(),
+    }).rename_axis('分')
+    return summary, heatmap, rates
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="板書記録アーカイブの集計")
+    parser.add_argument("directory", help="板書データ（JSON）のあるディレクトリ")
+    parser.add_argument("--out", default="analytics_out", help="集計結果（CSV）の出力先")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_DIR, help="ファイルごとの結果のキャッシュ先")
+    parser.add_argument("--workers", type=int, default=None, help="並列プロセス数")
+    args = parser.parse_args(argv)
+
+    results, errors, processed = analyze_corpus(args.directory, args.cache, args.workers)
+    print(f"{len(results) + len(errors)}ファイル（新規に処理: {processed}ファイル、読み込めなかったファイル: {len(errors)}）")
+    for name, message in errors.items():
+        print(f"  {name}: {message}")
+    os.makedirs(args.out, exist_ok=True)
+    pd.DataFrame({'ファイル': list(errors), 'エラー': list(errors.values())}).to_csv(
+        os.path.join(args.out, "errors.csv"), index=False, encoding='utf-8-sig')
+    if not results:
+        return 0
+
+    summary, heatmap, rates = summarize(results)
+    summary.to_csv(os.path.join(args.out, "summary.csv"), index=False, encoding='utf-8-sig')
+    heatmap.to_csv(os.path.join(args.out, "heatmap.csv"), encoding='utf-8-sig')
+    rates.to_csv(os.path.join(args.out, "rates_per_minute.csv"), encoding='utf-8-sig')
+    print(summary.to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
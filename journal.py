@@ -0,0 +1,252 @@
+"""自動保存ジャーナル
+
+記録・削除したアクションを1操作1行（JSON Lines）でジャーナルファイルに追記し、
+一定件数ごとにスナップショットへまとめる（コンパクション）。復元時は
+スナップショットを読み込み、それ以降のジャーナル末尾だけを再生する。
+
+ファイル構成（セッション名ごと）:
+    <directory>/<name>.journal.jsonl   追記専用のジャーナル
+    <directory>/<name>.snapshot.json   最新のスナップショット（通常の保存形式と同じ）
+    <directory>/<name>.lock            使用中のセッションが排他ロックを持つファイル
+
+同じ保存名を複数のセッション（複製したタブなど）で同時に使うと通し番号が
+食い違うため、使用中のジャーナルは acquire() で排他ロックを取る。取れなかった
+場合は fork() でその時点の内容を別名のジャーナルに引き継ぐ。
+"""
+import itertools
+import json
+import os
+import re
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from action_model import action_from_dict, load_save_data
+from blackboard import build_save_data, delete_actions
+
+
+def _safe_name(name):
+    """ファイル名に使えない文字を置き換える"""
+    return re.sub(r'[^\w\-]', '_', name.strip()) or 'default'
+
+
+def _lock_exclusive(f):
+    """ファイルの排他ロックを待たずに取る（取れなければ OSError）
+
+    ロックは開いたファイルごとなので、同じプロセス内の別セッションとも排他になる。
+    """
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+
+
+class JournalInUseError(Exception):
+    """ジャーナルが他のセッションで使用中"""
+
+
+class ActionJournal:
+    """アクション操作の追記型ジャーナル"""
+
+    def __init__(self, directory, name, fsync_every=20, fsync_interval=2.0, compact_every=500):
+        self.name = _safe_name(name)
+        self.directory = directory
+        self.journal_path = os.path.join(directory, f"{self.name}.journal.jsonl")
+        self.snapshot_path = os.path.join(directory, f"{self.name}.snapshot.json")
+        self.lock_path = os.path.join(directory, f"{self.name}.lock")
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+
+        self.seq = 0  # 最後に書き込んだ操作の通し番号
+        self.records_since_snapshot = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._file = None
+        self._lock_file = None
+        # 最後の書き込みの後に操作がなくても fsync_interval 後には同期する
+        self._lock = threading.Lock()
+        self._idle_timer = None
+
+    def acquire(self):
+        """このジャーナルの排他ロックを取る（他のセッションが使用中なら JournalInUseError）
+
+        ロックは close() するまで保持する。
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        lock_file = open(self.lock_path, "a+")
+        try:
+            _lock_exclusive(lock_file)
+        except OSError:
+            lock_file.close()
+            raise JournalInUseError(f"保存名「{self.name}」は他のタブ（セッション）で使用中です") from None
+        self._lock_file = lock_file
+
+    def fork(self):
+        """使用中のこのジャーナルの現在の内容を、空いている別名（<name>_2, <name>_3, ...）の
+        ジャーナルに引き継いで返す（排他ロック取得済み）"""
+        actions, images = self.restore(repair=False)
+        for number in itertools.count(2):
+            other = ActionJournal(self.directory, f"{self.name}_{number}", self.fsync_every,
+                                  self.fsync_interval, self.compact_every)
+            try:
+                other.acquire()
+            except JournalInUseError:
+                continue
+            if other.exists():
+                other.close()
+                continue
+            other.compact(actions, images)
+            return other
+
+    def exists(self):
+        """保存済みのジャーナルまたはスナップショットがあるか"""
+        return os.path.exists(self.journal_path) or os.path.exists(self.snapshot_path)
+
+    def restore(self, repair=True):
+        """スナップショットとジャーナル末尾から (actions, images) を復元
+
+        repair が False のときはファイルを書き換えない（他のセッションが使用中の場合）。
+        """
+        actions, images = [], {}
+        snapshot_seq = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            actions, images = load_save_data(snapshot)
+            snapshot_seq = snapshot.get('metadata', {}).get('journal_seq', 0)
+
+        self.seq = snapshot_seq
+        self.records_since_snapshot = 0
+        truncated = False
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 書き込み途中で落ちた最終行は捨てる
+                        truncated = True
+                        break
+                    # コンパクション直後に落ちた場合、反映済みの操作は飛ばす
+                    if record['seq'] <= snapshot_seq:
+                        continue
+                    actions = self._apply(record, actions, images)
+                    self.seq = record['seq']
+                    self.records_since_snapshot += 1
+        if truncated and repair:
+            # 壊れた行の後ろに追記しないよう、復元した状態でまとめ直す
+            self.compact(actions, images)
+        return actions, images
+
+    @staticmethod
+    def _apply(record, actions, images):
+        if record['op'] == 'add':
+            if record.get('image'):
+                images.update(record['image'])
+            actions.append(action_from_dict(record['action'], len(actions)))
+        elif record['op'] == 'delete':
+            actions = delete_actions(actions, record['indices'])
+        return actions
+
+    def _open(self):
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._file = open(self.journal_path, "a", encoding="utf-8")
+        return self._file
+
+    def _write(self, record):
+        with self._lock:
+            self.seq += 1
+            record['seq'] = self.seq
+            f = self._open()
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            # ブラウザの再読み込みに備えてOSへは毎回渡し、fsyncはまとめて行う
+            f.flush()
+            self._unsynced += 1
+            self.records_since_snapshot += 1
+            if (self._unsynced >= self.fsync_every
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync_locked()
+            elif self._idle_timer is None:
+                self._idle_timer = threading.Timer(self.fsync_interval, self._idle_sync)
+                self._idle_timer.daemon = True
+                self._idle_timer.start()
+
+    def _idle_sync(self):
+        with self._lock:
+            self._idle_timer = None
+            self._sync_locked()
+
+    def log_add(self, action, images=None):
+        """アクションの追加を記録（貼る の画像も一緒に保存）"""
+        record = {'op': 'add', 'action': action.to_dict()}
+        if action.type == '貼る' and images and action.image_id in images:
+            record['image'] = {action.image_id: images[action.image_id]}
+        self._write(record)
+
+    def log_delete(self, indices):
+        """アクションの削除（複数可）を記録"""
+        self._write({'op': 'delete', 'indices': list(indices)})
+
+    def needs_compaction(self):
+        return self.records_since_snapshot >= self.compact_every
+
+    def compact(self, actions, images):
+        """現在の状態をスナップショットに書き出し、ジャーナルを空にする"""
+        with self._lock:
+            self._compact_locked(actions, images)
+
+    def _compact_locked(self, actions, images):
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot = build_save_data(actions, images)
+        snapshot['metadata']['journal_seq'] = self.seq
+
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        # スナップショット確定後にジャーナルを切り詰める
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        with open(self.journal_path, "w", encoding="utf-8"):
+            pass
+        self.records_since_snapshot = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        """未同期の書き込みをディスクへ反映"""
+        with self._lock:
+            self._sync_locked()
+
+    def _sync_locked(self):
+        if self._file is not None and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+                self._idle_timer = None
+            if self._file is not None:
+                self._sync_locked()
+                self._file.close()
+                self._file = None
+            if self._lock_file is not None:
+                # 閉じるとロックも外れる
+                self._lock_file.close()
+                self._lock_file = None
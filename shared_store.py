@@ -0,0 +1,216 @@
+"""複数の記録者による共同記録
+
+同じ授業を複数のセッション（記録者）が同時に記録できるよう、操作を
+ローカルのSQLiteファイルに追記する。書き込みは BEGIN IMMEDIATE で直列化し、
+各クライアントは前回以降に追記された操作（seq が大きいもの）だけを取り込む。
+
+アクションの並び順は (時間, 記録者, 記録者ごとの通し番号) で決まるため、
+どのクライアントでも同じ順序・同じ action_id になる。消去の対象は
+位置ではなく記録者と通し番号で保存する。
+"""
+import json
+import os
+import sqlite3
+import uuid
+from bisect import insort
+
+from action_model import ERASE_TYPE, action_from_dict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ops (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    lecture TEXT NOT NULL,
+    origin TEXT NOT NULL,
+    origin_seq INTEGER NOT NULL,
+    op TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    UNIQUE (lecture, origin, origin_seq)
+);
+CREATE INDEX IF NOT EXISTS ops_lecture_seq ON ops (lecture, seq);
+CREATE TABLE IF NOT EXISTS images (
+    lecture TEXT NOT NULL,
+    image_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (lecture, image_id)
+);
+"""
+
+
+class SharedLectureStore:
+    """共同記録用のSQLiteストア"""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Streamlitは再実行ごとに別スレッドで動くことがある
+        self.conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def append(self, lecture, origin, ops, images=None):
+        """操作 [(op, payload), ...] を1つのトランザクションで追記し、通し番号のリストを返す"""
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT COALESCE(MAX(origin_seq), 0) FROM ops WHERE lecture = ? AND origin = ?",
+                (lecture, origin),
+            ).fetchone()
+            first = row[0] + 1
+            origin_seqs = list(range(first, first + len(ops)))
+            conn.executemany(
+                "INSERT INTO ops (lecture, origin, origin_seq, op, payload) VALUES (?, ?, ?, ?, ?)",
+                [(lecture, origin, origin_seq, op, json.dumps(payload, ensure_ascii=False))
+                 for origin_seq, (op, payload) in zip(origin_seqs, ops)],
+            )
+            if images:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO images (lecture, image_id, payload) VALUES (?, ?, ?)",
+                    [(lecture, image_id, json.dumps(info, ensure_ascii=False)) for image_id, info in images.items()],
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return origin_seqs
+
+    def fetch_since(self, lecture, after_seq):
+        """after_seq より後に追記された操作を (seq, origin, origin_seq, op, payload) で返す"""
+        rows = self.conn.execute(
+            "SELECT seq, origin, origin_seq, op, payload FROM ops WHERE lecture = ? AND seq > ? ORDER BY seq",
+            (lecture, after_seq),
+        ).fetchall()
+        return [(seq, origin, origin_seq, op, json.loads(payload)) for seq, origin, origin_seq, op, payload in rows]
+
+    def fetch_images(self, lecture, image_ids):
+        """指定した画像データを返す"""
+        image_ids = list(image_ids)
+        if not image_ids:
+            return {}
+        placeholders = ",".join("?" * len(image_ids))
+        rows = self.conn.execute(
+            f"SELECT image_id, payload FROM images WHERE lecture = ? AND image_id IN ({placeholders})",
+            [lecture, *image_ids],
+        ).fetchall()
+        return {image_id: json.loads(payload) for image_id, payload in rows}
+
+    def lectures(self):
+        """記録のある授業名の一覧"""
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT lecture FROM ops ORDER BY lecture")]
+
+    def close(self):
+        self.conn.close()
+
+
+class SharedLecture:
+    """共有ストア上の1つの授業を、あるセッション（記録者）から見たもの
+
+    actions / images はアプリの st.session_state と同じ形式で、sync() で
+    他の記録者の追記分を取り込む。
+    """
+
+    def __init__(self, store, lecture, observer):
+        self.store = store
+        self.lecture = lecture
+        self.observer = observer
+        # 記録者名が重なっても通し番号が衝突しないよう、セッションごとに一意にする
+        self.origin = f"{observer}#{uuid.uuid4().hex[:6]}"
+        self._origin_seq = 0  # このセッションが最後に追記した通し番号
+        self.last_seq = 0
+        self.actions = []
+        self.images = {}
+        self._order = []   # 並び順のキー (time, origin, origin_seq)
+        self._by_uid = {}  # (origin, origin_seq) -> action
+
+    def sync(self):
+        """新しく追記された操作を取り込む。変化があれば True"""
+        rows = self.store.fetch_since(self.lecture, self.last_seq)
+        if not rows:
+            return False
+
+        new_image_ids = set()
+        for seq, origin, origin_seq, op, payload in rows:
+            if op == 'add':
+                fields = dict(payload, origin=origin, origin_seq=origin_seq)
+                if payload['type'] == ERASE_TYPE:
+                    fields['target_action_id'] = -1  # 位置は _materialize で求める
+                action = action_from_dict(fields)
+                uid = (origin, origin_seq)
+                self._by_uid[uid] = action
+                insort(self._order, (action.time, origin, origin_seq))
+                if action.type == '貼る' and action.image_id:
+                    new_image_ids.add(action.image_id)
+            elif op == 'delete':
+                self._delete(tuple(payload['target']))
+            self.last_seq = seq
+
+        self.images.update(self.store.fetch_images(self.lecture, new_image_ids - self.images.keys()))
+        self._materialize()
+        return True
+
+    def _delete(self, uid):
+        """アクションと、それを対象とする消去アクションを取り除く"""
+        removed = {uid}
+        removed.update(
+            other_uid for other_uid, action in self._by_uid.items()
+            if action.type == ERASE_TYPE and tuple(action.extra['target_uid']) == uid
+        )
+        for removed_uid in removed:
+            action = self._by_uid.pop(removed_uid, None)
+            if action is not None:
+                self._order.remove((action.time, *removed_uid))
+
+    def _materialize(self):
+        """並び順に従って action_id と消去対象のIDを振り直す"""
+        self.actions = [self._by_uid[(origin, origin_seq)] for _, origin, origin_seq in self._order]
+        positions = {}
+        for i, action in enumerate(self.actions):
+            action.action_id = i
+            action.timestamp = i
+            positions[(action.extra['origin'], action.extra['origin_seq'])] = i
+        for action in self.actions:
+            if action.type == ERASE_TYPE:
+                # 他の記録者が対象を先に削除していた場合はどのアクションも指さない
+                action.target_action_id = positions.get(tuple(action.extra['target_uid']), -1)
+
+    def _target_uid(self, target_action_id):
+        """消去対象の action_id を (記録者, 通し番号) に変換
+
+        現在のアクション数以上のIDは、同時に追記するアクションを指す。
+        """
+        if target_action_id < len(self.actions):
+            target = self.actions[target_action_id]
+            return [target.extra['origin'], target.extra['origin_seq']]
+        return [self.origin, self._origin_seq + 1 + target_action_id - len(self.actions)]
+
+    def record(self, new_actions, images=None):
+        """アクション（現在の action_id を基準にしたもの）を追記して取り込む"""
+        ops = []
+        new_images = {}
+        for action in new_actions:
+            payload = {k: v for k, v in action.to_dict().items()
+                       if k not in ('action_id', 'timestamp', 'origin', 'origin_seq', 'target_action_id')}
+            payload['observer'] = self.observer
+            if action.type == ERASE_TYPE:
+                payload['target_uid'] = self._target_uid(action.target_action_id)
+            image_id = payload.get('image_id')
+            if image_id and images and image_id in images:
+                # 記録者間で画像IDが重ならないよう付け替える
+                shared_id = f"{self.origin}_{image_id}_{uuid.uuid4().hex[:8]}"
+                new_images[shared_id] = images[image_id]
+                payload['image_id'] = shared_id
+            ops.append(('add', payload))
+        self._append(ops, new_images)
+
+    def delete(self, indices):
+        """指定位置のアクションの削除を追記して取り込む"""
+        ops = [('delete', {'target': [self.actions[i].extra['origin'], self.actions[i].extra['origin_seq']]})
+               for i in indices]
+        self._append(ops)
+
+    def _append(self, ops, images=None):
+        origin_seqs = self.store.append(self.lecture, self.origin, ops, images)
+        self._origin_seq = origin_seqs[-1]
+        self.sync()
@@ -1,11 +1,27 @@
 import streamlit as st
+import io
 import json
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
+import os
+from dataclasses import replace
+from datetime import datetime
 import time
-import math
+from blackboard import (
+    BoardTimeline, get_grid_coordinates, parse_coordinates,
+    describe_action, dump_save_json, append_loaded_data, delete_actions,
+)
+from action_model import (
+    WriteAction, EraseAction, LineAction, EncloseAction, RelateAction, PasteAction,
+    ActionValidationError, load_save_data,
+)
+from journal import ActionJournal, JournalInUseError
+from board_component import blackboard_board
+from shared_store import SharedLectureStore, SharedLecture
+
+# 自動保存ファイルの保存先
+AUTOSAVE_DIR = "autosave"
+# 共同記録ストアの保存先と、他の記録者の追記を確認する間隔（秒）
+SHARED_STORE_PATH = os.path.join("shared", "lectures.sqlite3")
+SHARED_POLL_SECONDS = 2
 
 # ページ設定
 st.set_page_config(
@@ -25,909 +41,1090 @@ if 'playback_speed' not in st.session_state:
     st.session_state.playback_speed = 1.0
 if 'lecture_records' not in st.session_state:
     st.session_state.lecture_records = None
+if 'lecture_records_file_id' not in st.session_state:
+    st.session_state.lecture_records_file_id = None
+# 板書と授業記録の対応表（データが変わるまで使い回す）
+if 'transcript_join' not in st.session_state:
+    st.session_state.transcript_join = None
+# 再生用の索引（データが変わるまで使い回す）
+if 'board_timeline' not in st.session_state:
+    st.session_state.board_timeline = None
+# アクション履歴の表（データが変わるまで使い回す）と選択中の行
+if 'history_table' not in st.session_state:
+    st.session_state.history_table = None
+if 'history_selected' not in st.session_state:
+    st.session_state.history_selected = set()
+if 'delete_confirm' not in st.session_state:
+    st.session_state.delete_confirm = False
+# 比較再現の状態
+if 'compare_time' not in st.session_state:
+    st.session_state.compare_time = 0.0
+if 'compare_playing' not in st.session_state:
+    st.session_state.compare_playing = False
+if 'compare_timelines' not in st.session_state:
+    st.session_state.compare_timelines = {}
 # セッション状態に消去されたアクションIDを追跡
 if 'erased_actions' not in st.session_state:
     st.session_state.erased_actions = set()
 # 画像データを保存するための状態を追加
 if 'uploaded_images' not in st.session_state:
     st.session_state.uploaded_images = {}
+# 保存用データの変更検知（アクション・画像を変更するたびに加算）
+if 'data_version' not in st.session_state:
+    st.session_state.data_version = 0
+if 'save_cache' not in st.session_state:
+    st.session_state.save_cache = None
+# 自動保存ジャーナル（有効時のみ）
+if 'journal' not in st.session_state:
+    st.session_state.journal = None
+if 'autosave_forked_from' not in st.session_state:
+    st.session_state.autosave_forked_from = None
+# 共同記録（参加中のみ）
+if 'shared' not in st.session_state:
+    st.session_state.shared = None
+if 'shared_full_run' not in st.session_state:
+    st.session_state.shared_full_run = False
 
-# 黒板のグリッド設定
-GRID_WIDTH = 30
-GRID_HEIGHT = 10
-CELL_SIZE = 25  # 20から25に変更
+def mark_dirty():
+    """アクション・画像の変更を記録し、保存用データのキャッシュを無効化"""
+    st.session_state.data_version += 1
 
-def create_blackboard_html(actions, current_time=None):
-    """黒板のHTMLを生成"""
-    # 現在時刻までのアクションをフィルタリング
-    if current_time is not None:
-        filtered_actions = [action for action in actions if action.get('time', action['timestamp']) <= current_time]
-    else:
-        filtered_actions = actions
-    
-    # 消去されたアクションIDを追跡
-    erased_action_ids = set()
-    for action in filtered_actions:
-        if action['type'] == '消す（よける）':
-            erased_action_ids.add(action['target_action_id'])
-    
-    html = f"""
-    <div style="position: relative; margin: 10px auto;">
-        <!-- 座標表示 -->
-        <div style="position: absolute; left: 0; top: -20px; font-size: 12px; color: #666;">
-            {"".join([f'<span style="position: absolute; left: {i * CELL_SIZE + 15}px;">{i}</span>' for i in range(0, GRID_WIDTH, 5)])}
-        </div>
-        <div style="position: absolute; left: -20px; top: 0; font-size: 12px; color: #666;">
-            {"".join([f'<span style="position: absolute; top: {i * CELL_SIZE + 10}px;">{i}</span>' for i in range(0, GRID_HEIGHT, 2)])}
-        </div>
-        
-        <!-- 黒板 -->
-        <div style="
-            width: {GRID_WIDTH * CELL_SIZE}px; 
-            height: {GRID_HEIGHT * CELL_SIZE}px; 
-            background-color: #2d5a2d; 
-            position: relative; 
-            border: 2px solid #fff;
-            margin-left: 25px;
-            margin-top: 25px;
-        ">
+def add_action(action):
+    """アクションを追加（自動保存中はジャーナルにも追記）"""
+    # 記録画面の時刻の既定値を次の回で進める
+    st.session_state.advance_record_time = True
+    if st.session_state.shared is not None:
+        st.session_state.shared.record([action], st.session_state.uploaded_images)
+        apply_shared_state()
+        return
+    st.session_state.actions.append(action)
+    mark_dirty()
+    journal = st.session_state.journal
+    if journal is not None:
+        journal.log_add(action, st.session_state.uploaded_images)
+        if journal.needs_compaction():
+            save_journal_snapshot()
+
+def add_actions(new_actions):
+    """複数のアクションをまとめて追加（自動保存中はスナップショットにまとめる）"""
+    if st.session_state.shared is not None:
+        st.session_state.shared.record(new_actions, st.session_state.uploaded_images)
+        apply_shared_state()
+        return
+    st.session_state.actions.extend(new_actions)
+    mark_dirty()
+    save_journal_snapshot()
+
+def remove_actions(indices):
+    """アクションをまとめて削除（自動保存中はジャーナルにも追記）"""
+    if st.session_state.shared is not None:
+        st.session_state.shared.delete(indices)
+        apply_shared_state()
+        return
+    st.session_state.actions = delete_actions(st.session_state.actions, indices)
+    mark_dirty()
+    journal = st.session_state.journal
+    if journal is not None:
+        journal.log_delete(indices)
+        if journal.needs_compaction():
+            save_journal_snapshot()
+
+def save_journal_snapshot():
+    """自動保存中なら現在の状態をスナップショットにまとめる（一括読み込み後など）"""
+    if st.session_state.journal is not None:
+        st.session_state.journal.compact(st.session_state.actions, st.session_state.uploaded_images)
+
+def start_autosave(name):
+    """自動保存を開始。既存の保存があれば復元し、なければ現在の状態から開始"""
+    journal = ActionJournal(AUTOSAVE_DIR, name)
+    st.session_state.autosave_forked_from = None
+    try:
+        journal.acquire()
+    except JournalInUseError:
+        # 複製したタブや再読み込み直後（前のセッションが残っている間）は同じファイルに
+        # 書き込まないよう、その時点の内容を別名の保存に引き継ぐ
+        st.session_state.autosave_forked_from = journal.name
+        journal = journal.fork()
+    try:
+        if journal.exists():
+            st.session_state.actions, st.session_state.uploaded_images = journal.restore()
+            mark_dirty()
+        else:
+            journal.compact(st.session_state.actions, st.session_state.uploaded_images)
+    except BaseException:
+        journal.close()
+        raise
+    st.session_state.journal = journal
+    # ブラウザを再読み込みしても同じ保存から復元できるようURLに残す
+    st.query_params['autosave'] = journal.name
+
+def stop_autosave():
+    """自動保存を停止"""
+    st.session_state.journal.close()
+    st.session_state.journal = None
+    st.query_params.pop('autosave', None)
+
+def record_time_input():
+    """記録する時刻の入力
+
+    他の記録者の追記でアクション数が変わっても入力中の値が消えないよう値はキーで保ち、
+    既定値（アクション数）は自分が記録したときだけ進める。
     """
+    if 'record_time' not in st.session_state or st.session_state.pop('advance_record_time', False):
+        st.session_state.record_time = float(len(st.session_state.actions))
+    return st.number_input("時間（秒）", min_value=0.0, step=0.1, key="record_time")
+
+def action_uid(action):
+    """アクションの識別子（共同記録中は記録者と通し番号、それ以外は action_id）"""
+    if st.session_state.shared is not None:
+        return (action.extra['origin'], action.extra['origin_seq'])
+    return action.action_id
+
+def get_board_timeline():
+    """現在の記録の再生用索引（データが変わるまでキャッシュ）"""
+    cache = st.session_state.board_timeline
+    if cache is None or cache['version'] != st.session_state.data_version:
+        cache = {
+            'version': st.session_state.data_version,
+            'timeline': BoardTimeline(st.session_state.actions, st.session_state.uploaded_images),
+        }
+        st.session_state.board_timeline = cache
+    return cache['timeline']
+
+def load_compare_timeline(uploaded_file):
+    """比較用に読み込んだJSONファイルの再生用索引（ファイルごとにキャッシュ）"""
+    timelines = st.session_state.compare_timelines
+    if uploaded_file.file_id not in timelines:
+        actions, images = load_save_data(json.load(uploaded_file))
+        timelines[uploaded_file.file_id] = BoardTimeline(actions, images)
+    return timelines[uploaded_file.file_id]
+
+def get_transcript_join(tolerance, direction):
+    """板書アクションと授業記録の対応表と、そのCSVを返す（入力が変わるまでキャッシュ）"""
+    from transcript import join_actions_with_records
+    key = (st.session_state.data_version, st.session_state.lecture_records_file_id, tolerance, direction)
+    cache = st.session_state.transcript_join
+    if cache is None or cache['key'] != key:
+        joined = join_actions_with_records(
+            st.session_state.actions, st.session_state.lecture_records, tolerance, direction
+        )
+        # Excelで文字化けしないようBOM付きUTF-8で出力
+        cache = {'key': key, 'table': joined, 'csv': joined.to_csv(index=False).encode('utf-8-sig')}
+        st.session_state.transcript_join = cache
+    return cache['table'], cache['csv']
+
+def apply_shared_state():
+    """共同記録の内容を現在の記録に反映"""
+    st.session_state.actions = st.session_state.shared.actions
+    st.session_state.uploaded_images = st.session_state.shared.images
+    mark_dirty()
+
+def join_shared_lecture(lecture, observer, share_current=False):
+    """共同記録に参加（share_current なら現在の記録を追記してから参加）"""
+    shared = SharedLecture(SharedLectureStore(SHARED_STORE_PATH), lecture, observer)
+    shared.sync()
+    if share_current and st.session_state.actions:
+        # 現在の記録の消去対象IDを、共同記録の末尾に追加した後のIDに合わせる
+        offset = len(shared.actions)
+        local_actions = [
+            replace(action, target_action_id=action.target_action_id + offset)
+            if action.type == '消す（よける）' else action
+            for action in st.session_state.actions
+        ]
+        shared.record(local_actions, st.session_state.uploaded_images)
+    st.session_state.shared = shared
+    apply_shared_state()
+    # ブラウザを再読み込みしても同じ授業に参加し直せるようURLに残す
+    st.query_params['shared'] = lecture
+    st.query_params['observer'] = observer
+
+def leave_shared_lecture():
+    """共同記録から抜ける（記録はこのセッションに残る）"""
+    st.session_state.shared.store.close()
+    st.session_state.shared = None
+    st.query_params.pop('shared', None)
+    st.query_params.pop('observer', None)
+    # 共同記録中はジャーナルに追記していないので、以降の追記・削除の基準になるよう今の記録をまとめる
+    save_journal_snapshot()
+
+@st.fragment(run_every=SHARED_POLL_SECONDS)
+def poll_shared_lecture():
+    """他の記録者の追記を定期的に取り込む（追記があれば画面全体を更新）"""
+    if st.session_state.shared is not None and st.session_state.shared.sync():
+        apply_shared_state()
+        # 画面全体の実行中は、この後の描画に反映されるので再実行しない
+        # （再実行するとこの回のボタン操作が失われる）
+        if not st.session_state.shared_full_run:
+            st.rerun()
+
+def render_shared_sidebar():
+    """サイドバーの共同記録設定"""
+    with st.sidebar:
+        st.subheader("👥 共同記録")
+        shared = st.session_state.shared
+        if shared is None:
+            lecture = st.text_input("授業名", placeholder="例：6年1組_算数_0612", key="shared_lecture")
+            observer = st.text_input("記録者名", placeholder="例：観察者A", key="shared_observer")
+            share_current = st.checkbox("現在の記録を共同記録に追加する", value=False,
+                                        disabled=not st.session_state.actions)
+            # 追加しないで参加すると現在の記録は共同記録の内容に置き換わる
+            discard_confirmed = True
+            if st.session_state.actions and not share_current:
+                st.warning(f"参加すると現在の記録（{len(st.session_state.actions)}件）は共同記録の内容に置き換わります")
+                discard_confirmed = st.checkbox("現在の記録を破棄して参加する", value=False)
+            if st.button("共同記録に参加", disabled=not (lecture and observer and discard_confirmed)):
+                join_shared_lecture(lecture, observer, share_current)
+                st.rerun()
+        else:
+            st.session_state.shared_full_run = True
+            poll_shared_lecture()
+            st.session_state.shared_full_run = False
+            st.success(f"共同記録中：{shared.lecture}（{shared.observer}）")
+            observers = sorted({action.extra['observer'] for action in shared.actions})
+            st.caption(f"{len(shared.actions)}件のアクション／記録者：{'、'.join(observers) or 'なし'}")
+            if st.session_state.journal is not None:
+                st.caption("共同記録中は自動保存ジャーナルの代わりに共有ストアに記録されます")
+            if st.button("共同記録から抜ける"):
+                leave_shared_lecture()
+                st.rerun()
+
+def render_autosave_sidebar():
+    """サイドバーの自動保存設定"""
+    with st.sidebar:
+        st.subheader("💾 自動保存")
+        journal = st.session_state.journal
+        if journal is None:
+            name = st.text_input("保存名", placeholder="例：6年1組_算数_0612",
+                                 help="同じ保存名で開始すると、前回の記録から復元します")
+            if st.button("自動保存を開始", disabled=not name):
+                start_autosave(name)
+                st.rerun()
+        else:
+            st.success(f"自動保存中：{journal.name}")
+            if st.session_state.autosave_forked_from:
+                st.warning(f"「{st.session_state.autosave_forked_from}」は他のタブで使用中のため、"
+                           f"その内容を引き継いで「{journal.name}」に保存しています")
+            st.caption(f"ジャーナル {journal.records_since_snapshot} 件（{journal.compact_every} 件ごとにまとめます）")
+            if st.button("自動保存を停止"):
+                stop_autosave()
+                st.rerun()
+
+def render_record_view():
+    """板書記録画面"""
+    st.header("板書記録")
     
-    # グリッド線を描画
-    for i in range(GRID_WIDTH + 1):
-        html += f"""
-        <div style="
-            position: absolute; 
-            left: {i * CELL_SIZE}px; 
-            top: 0; 
-            width: 1px; 
-            height: {GRID_HEIGHT * CELL_SIZE}px; 
-            background-color: rgba(255,255,255,0.1);
-        "></div>
-        """
-    
-    for i in range(GRID_HEIGHT + 1):
-        html += f"""
-        <div style="
-            position: absolute; 
-            left: 0; 
-            top: {i * CELL_SIZE}px; 
-            width: {GRID_WIDTH * CELL_SIZE}px; 
-            height: 1px; 
-            background-color: rgba(255,255,255,0.1);
-        "></div>
-        """
+    # 授業記録CSVのアップロード
+    uploaded_csv = st.file_uploader("授業記録CSVファイル（オプション）", type=['csv'])
+    if uploaded_csv is not None:
+        import pandas as pd  # 重いモジュールは初回使用時に読み込む
+        try:
+            # 同じファイルは再読み込みしない
+            if uploaded_csv.file_id != st.session_state.lecture_records_file_id:
+                st.session_state.lecture_records = pd.read_csv(uploaded_csv)
+                st.session_state.lecture_records_file_id = uploaded_csv.file_id
+            st.success("授業記録を読み込みました")
+            st.dataframe(st.session_state.lecture_records.head())
+        except Exception as e:
+            st.error(f"CSVファイルの読み込みエラー: {e}")
     
-    # アクションを描画（消去されていないもののみ）
-    for action in filtered_actions:
-        if action['type'] == '消す（よける）':
-            continue
-        if action.get('action_id') in erased_action_ids:
-            continue
-            
-        if action['type'] == '書く':
-            # 文字の描画
-            start_x = action['start_x'] * CELL_SIZE + CELL_SIZE // 2
-            start_y = action['start_y'] * CELL_SIZE + CELL_SIZE // 2
-            end_x = action['end_x'] * CELL_SIZE + CELL_SIZE // 2
-            end_y = action['end_y'] * CELL_SIZE + CELL_SIZE // 2
-            
-            # 書き順の線を描画
-            html += f"""
-            <svg style="position: absolute; top: 0; left: 0; width: 100%; height: 100%; pointer-events: none;">
-                <line x1="{start_x}" y1="{start_y}" x2="{end_x}" y2="{end_y}" 
-                      stroke="rgba(255,255,255,0.3)" stroke-width="1" stroke-dasharray="2,2"/>
-            </svg>
-            """
-            
-            # 文字の配置計算
-            if action['direction'] == '横書き':
-                text_x = start_x
-                text_y = start_y
-                writing_mode = 'horizontal-tb'
-                text_orientation = 'mixed'
+    # 表計算ファイルからの一括取り込み
+    with st.expander("📥 アクション一括取り込み（CSV/TSV/Excel .xlsx）"):
+        st.caption("1行1アクション。列：type, time, start_x, start_y, end_x, end_y, content, direction, color, size, thickness, "
+                   f"target_action_id, bg_color, border_color, label（ファイル内の行のIDは {len(st.session_state.actions)} から順に振られます）")
+        bulk_file = st.file_uploader("アクション一覧ファイル", type=['csv', 'tsv', 'txt', 'xlsx'], key="bulk_file")
+        if bulk_file is not None:
+            from bulk_import import read_action_table, validate_action_table, table_to_actions
+            try:
+                table = read_action_table(bulk_file, bulk_file.name)
+            except ImportError as e:
+                st.error(f"Excelファイルの読み込みには openpyxl が必要です: {e}")
+            except Exception as e:
+                st.error(f"ファイルの読み込みエラー: {e}")
             else:
-                text_x = start_x
-                text_y = start_y
-                writing_mode = 'vertical-rl'
-                text_orientation = 'upright'
-            
-            html += f"""
-            <div style="
-                position: absolute; 
-                left: {text_x - 10}px; 
-                top: {text_y - 10}px; 
-                color: {action['color']}; 
-                font-size: {action['size']}px;
-                font-weight: bold;
-                writing-mode: {writing_mode};
-                text-orientation: {text_orientation};
-                white-space: nowrap;
-                pointer-events: none;
-            ">{action['content']}</div>
-            """
-            
-            # 開始点と終了点のマーカー
-            html += f"""
-            <div style="
-                position: absolute; 
-                left: {start_x - 3}px; 
-                top: {start_y - 3}px; 
-                width: 6px; 
-                height: 6px; 
-                background-color: #00ff00; 
-                border-radius: 50%;
-                border: 1px solid white;
-            " title="書き始め"></div>
-            <div style="
-                position: absolute; 
-                left: {end_x - 3}px; 
-                top: {end_y - 3}px; 
-                width: 6px; 
-                height: 6px; 
-                background-color: #ff0000; 
-                border-radius: 50%;
-                border: 1px solid white;
-            " title="書き終わり"></div>
-            """
-        
-        elif action['type'] == '線を引く':
-            start_x = action['start_x'] * CELL_SIZE + CELL_SIZE // 2
-            start_y = action['start_y'] * CELL_SIZE + CELL_SIZE // 2
-            end_x = action['end_x'] * CELL_SIZE + CELL_SIZE // 2
-            end_y = action['end_y'] * CELL_SIZE + CELL_SIZE // 2
-            
-            html += f"""
-            <svg style="position: absolute; top: 0; left: 0; width: 100%; height: 100%; pointer-events: none;">
-                <line x1="{start_x}" y1="{start_y}" x2="{end_x}" y2="{end_y}" 
-                      stroke="{action['color']}" stroke-width="{action['thickness']}"/>
-            </svg>
-            """
-        
-        elif action['type'] == '囲う':
-            start_x = action['start_x'] * CELL_SIZE
-            start_y = action['start_y'] * CELL_SIZE
-            end_x = action['end_x'] * CELL_SIZE
-            end_y = action['end_y'] * CELL_SIZE
-            
-            width = abs(end_x - start_x)
-            height = abs(end_y - start_y)
-            left = min(start_x, end_x)
-            top = min(start_y, end_y)
-            
-            html += f"""
-            <div style="
-                position: absolute; 
-                left: {left}px; 
-                top: {top}px; 
-                width: {width}px; 
-                height: {height}px; 
-                border: 2px solid {action['color']}; 
-                border-radius: 5px;
-                pointer-events: none;
-            "></div>
-            """
+                table, errors = validate_action_table(table, st.session_state.actions)
+                if not errors.empty:
+                    st.error(f"{len(table)}行中 {errors['行'].nunique()}行にエラーがあります。修正してから取り込んでください。")
+                    st.dataframe(errors, hide_index=True)
+                else:
+                    st.success(f"{len(table)}行を検証しました")
+                    st.dataframe(table.head(), hide_index=True)
+                    if st.button(f"➕ {len(table)}件のアクションを追加"):
+                        add_actions(table_to_actions(table, len(st.session_state.actions)))
+                        st.success(f"{len(table)}件のアクションを追加しました")
+                        st.rerun()
+    
+    # アクション選択
+    col1, col2 = st.columns([1, 2])
+    
+    with col1:
+        action_type = st.selectbox("アクションタイプ", ["書く", "消す（よける）", "線を引く", "囲う", "関連付ける", "貼る"])
         
-        elif action['type'] == '関連付ける':
-            start_x = action['start_x'] * CELL_SIZE + CELL_SIZE // 2
-            start_y = action['start_y'] * CELL_SIZE + CELL_SIZE // 2
-            end_x = action['end_x'] * CELL_SIZE + CELL_SIZE // 2
-            end_y = action['end_y'] * CELL_SIZE + CELL_SIZE // 2
+        if action_type == "書く":
+            st.subheader("文字書き込み")
+            content = st.text_input("書き込む文字")
             
-            # 矢印の計算
-            angle = math.atan2(end_y - start_y, end_x - start_x)
-            arrow_length = 10
-            arrow_angle = 0.5
+            # 座標選択
+            coord_options = get_grid_coordinates()
+            start_coord = st.selectbox("書き始め座標", coord_options, key="text_start")
+            end_coord = st.selectbox("書き終わり座標", coord_options, key="text_end")
             
-            arrow_x1 = end_x - arrow_length * math.cos(angle - arrow_angle)
-            arrow_y1 = end_y - arrow_length * math.sin(angle - arrow_angle)
-            arrow_x2 = end_x - arrow_length * math.cos(angle + arrow_angle)
-            arrow_y2 = end_y - arrow_length * math.sin(angle + arrow_angle)
+            # 書字方向選択
+            direction = st.radio("書字方向", ["横書き", "縦書き"])
             
-            html += f"""
-            <svg style="position: absolute; top: 0; left: 0; width: 100%; height: 100%; pointer-events: none;">
-                <line x1="{start_x}" y1="{start_y}" x2="{end_x}" y2="{end_y}" 
-                      stroke="{action['color']}" stroke-width="2" stroke-dasharray="5,5"/>
-                <polygon points="{end_x},{end_y} {arrow_x1},{arrow_y1} {arrow_x2},{arrow_y2}" 
-                         fill="{action['color']}"/>
-            </svg>
-            """
-        
-        elif action['type'] == '貼る':
-            start_x = action['start_x'] * CELL_SIZE
-            start_y = action['start_y'] * CELL_SIZE
-            end_x = action['end_x'] * CELL_SIZE
-            end_y = action['end_y'] * CELL_SIZE
+            # スタイル設定
+            color = st.color_picker("文字色", "#FFFFFF")
+            size = st.slider("文字サイズ", 8, 24, 12)
             
-            width = abs(end_x - start_x)
-            height = abs(end_y - start_y)
-            left = min(start_x, end_x)
-            top = min(start_y, end_y)
+            # 時間入力を追加
+            time_input = record_time_input()
             
-            # 画像がある場合は画像を表示、ない場合は白い四角
-            if action.get('image_id') and action['image_id'] in st.session_state.uploaded_images:
-                image_info = st.session_state.uploaded_images[action['image_id']]
-                image_data = image_info['data']
-                image_type = image_info['type']
-                
-                html += f"""
-                <div style="
-                    position: absolute; 
-                    left: {left}px; 
-                    top: {top}px; 
-                    width: {width}px; 
-                    height: {height}px; 
-                    border: 2px solid {action['border_color']}; 
-                    border-radius: 3px;
-                    overflow: hidden;
-                    pointer-events: none;
-                ">
-                    <img src="data:{image_type};base64,{image_data}" 
-                         style="width: 100%; height: 100%; object-fit: cover;" 
-                         alt="{action['label']}" />
-                </div>
-                """
-            else:
-                # 代替表示（白い四角）
-                html += f"""
-                <div style="
-                    position: absolute; 
-                    left: {left}px; 
-                    top: {top}px; 
-                    width: {width}px; 
-                    height: {height}px; 
-                    background-color: {action['bg_color']}; 
-                    border: 2px solid {action['border_color']}; 
-                    border-radius: 3px;
-                    display: flex;
-                    align-items: center;
-                    justify-content: center;
-                    font-size: 10px;
-                    color: #666;
-                    pointer-events: none;
-                ">{action['label']}</div>
-                """
-    
-    html += "</div></div>"
-    return html
-
-def get_grid_coordinates():
-    """グリッド座標の選択肢を生成"""
-    coords = []
-    for y in range(GRID_HEIGHT):
-        for x in range(GRID_WIDTH):
-            coords.append(f"({x},{y})")
-    return coords
-
-def parse_coordinates(coord_str):
-    """座標文字列をパース"""
-    coord_str = coord_str.strip("()");
-    x, y = map(int, coord_str.split(","))
-    return x, y
-
-def main():
-    st.title("📝 板書記録・再現システム")
-    
-    # タブの作成
-    tab1, tab2, tab3 = st.tabs(["📝 板書記録", "▶️ 板書再現", "📊 データ管理"])
-    
-    with tab1:
-        st.header("板書記録")
-        
-        # 授業記録CSVのアップロード
-        uploaded_csv = st.file_uploader("授業記録CSVファイル（オプション）", type=['csv'])
-        if uploaded_csv is not None:
-            try:
-                st.session_state.lecture_records = pd.read_csv(uploaded_csv)
-                st.success("授業記録を読み込みました")
-                st.dataframe(st.session_state.lecture_records.head())
-            except Exception as e:
-                st.error(f"CSVファイルの読み込みエラー: {e}")
-        
-        # アクション選択
-        col1, col2 = st.columns([1, 2])
-        
-        with col1:
-            action_type = st.selectbox("アクションタイプ", ["書く", "消す（よける）", "線を引く", "囲う", "関連付ける", "貼る"])
-            
-            if action_type == "書く":
-                st.subheader("文字書き込み")
-                content = st.text_input("書き込む文字")
-                
-                # 座標選択
-                coord_options = get_grid_coordinates()
-                start_coord = st.selectbox("書き始め座標", coord_options, key="text_start")
-                end_coord = st.selectbox("書き終わり座標", coord_options, key="text_end")
-                
-                # 書字方向選択
-                direction = st.radio("書字方向", ["横書き", "縦書き"])
-                
-                # スタイル設定
-                color = st.color_picker("文字色", "#FFFFFF")
-                size = st.slider("文字サイズ", 8, 24, 12)
-                
-                # 時間入力を追加
-                default_time = len(st.session_state.actions)
-                time_input = st.number_input("時間（秒）", min_value=0.0, value=float(default_time), step=0.1)
-                
-                if st.button("文字を記録"):
-                    if content:
-                        start_x, start_y = parse_coordinates(start_coord)
-                        end_x, end_y = parse_coordinates(end_coord)
-                        
-                        action = {
-                            'action_id': len(st.session_state.actions),  # ユニークID
-                            'type': '書く',
-                            'content': content,
-                            'start_x': start_x,
-                            'start_y': start_y,
-                            'end_x': end_x,
-                            'end_y': end_y,
-                            'direction': direction,
-                            'color': color,
-                            'size': size,
-                            'time': time_input,  # 時間を追加
-                            'timestamp': len(st.session_state.actions)
-                        }
-                        st.session_state.actions.append(action)
-                        st.success(f"文字「{content}」を記録しました")
-                        st.rerun()
-
-            elif action_type == "消す（よける）":
-                st.subheader("消去")
-                
-                # 消去可能なアクションを表示
-                available_actions = []
-                for i, action in enumerate(st.session_state.actions):
-                    if action['type'] != '消す（よける）' and action.get('action_id', i) not in st.session_state.erased_actions:
-                        if action['type'] == '書く':
-                            available_actions.append((action.get('action_id', i), f"文字「{action['content']}」({action['start_x']},{action['start_y']})"))
-                        elif action['type'] == '線を引く':
-                            available_actions.append((action.get('action_id', i), f"線 ({action['start_x']},{action['start_y']})→({action['end_x']},{action['end_y']})"))
-                        elif action['type'] == '囲う':
-                            available_actions.append((action.get('action_id', i), f"囲み ({action['start_x']},{action['start_y']})→({action['end_x']},{action['end_y']})"))
-                        elif action['type'] == '関連付ける':
-                            available_actions.append((action.get('action_id', i), f"関連付け ({action['start_x']},{action['start_y']})→({action['end_x']},{action['end_y']})"))
-                        elif action['type'] == '貼る':
-                            available_actions.append((action.get('action_id', i), f"貼り付け「{action['label']}」({action['start_x']},{action['start_y']})→({action['end_x']},{action['end_y']})"))
-                
-                if available_actions:
-                    selected_action = st.selectbox("消去するオブジェクト", 
-                                                 options=[aid for aid, desc in available_actions],
-                                                 format_func=lambda x: next(desc for aid, desc in available_actions if aid == x))
-                    
-                    time_input = st.number_input("時間（秒）", min_value=0.0, value=float(len(st.session_state.actions)), step=0.1)
-                    
-                    if st.button("消去を記録"):
-                        action = {
-                            'action_id': len(st.session_state.actions),
-                            'type': '消す（よける）',
-                            'target_action_id': selected_action,
-                            'time': time_input,
-                            'timestamp': len(st.session_state.actions)
-                        }
-                        st.session_state.actions.append(action)
-                        st.success("消去を記録しました")
-                        st.rerun()
-                else:
-                    st.info("消去可能なオブジェクトがありません")
-
-            elif action_type == "線を引く":
-                st.subheader("線描画")
-                coord_options = get_grid_coordinates()
-                start_coord = st.selectbox("開始座標", coord_options, key="line_start")
-                end_coord = st.selectbox("終了座標", coord_options, key="line_end")
-                color = st.color_picker("線の色", "#FFFFFF")
-                thickness = st.slider("線の太さ", 1, 10, 2)
-                
-                # 時間入力を追加
-                default_time = len(st.session_state.actions)
-                time_input = st.number_input("時間（秒）", min_value=0.0, value=float(default_time), step=0.1)
-                
-                if st.button("線を記録"):
-                    start_x, start_y = parse_coordinates(start_coord)
-                    end_x, end_y = parse_coordinates(end_coord)
-                    
-                    action = {
-                        'action_id': len(st.session_state.actions),
-                        'type': '線を引く',
-                        'start_x': start_x,
-                        'start_y': start_y,
-                        'end_x': end_x,
-                        'end_y': end_y,
-                        'color': color,
-                        'thickness': thickness,
-                        'time': time_input,
-                        'timestamp': len(st.session_state.actions)
-                    }
-                    st.session_state.actions.append(action)
-                    st.success("線を記録しました")
-                    st.rerun()
-
-            elif action_type == "囲う":
-                st.subheader("囲み")
-                coord_options = get_grid_coordinates()
-                start_coord = st.selectbox("開始座標", coord_options, key="box_start")
-                end_coord = st.selectbox("終了座標", coord_options, key="box_end")
-                color = st.color_picker("囲みの色", "#FFFF00")
-                
-                # 時間入力を追加
-                default_time = len(st.session_state.actions)
-                time_input = st.number_input("時間（秒）", min_value=0.0, value=float(default_time), step=0.1)
-                
-                if st.button("囲みを記録"):
+            if st.button("文字を記録"):
+                if content:
                     start_x, start_y = parse_coordinates(start_coord)
                     end_x, end_y = parse_coordinates(end_coord)
                     
-                    action = {
-                        'action_id': len(st.session_state.actions),
-                        'type': '囲う',
-                        'start_x': start_x,
-                        'start_y': start_y,
-                        'end_x': end_x,
-                        'end_y': end_y,
-                        'color': color,
-                        'time': time_input,
-                        'timestamp': len(st.session_state.actions)
-                    }
-                    st.session_state.actions.append(action)
-                    st.success("囲みを記録しました")
+                    action = WriteAction(
+                        action_id=len(st.session_state.actions),  # ユニークID
+                        content=content,
+                        start_x=start_x,
+                        start_y=start_y,
+                        end_x=end_x,
+                        end_y=end_y,
+                        direction=direction,
+                        color=color,
+                        size=size,
+                        time=time_input,  # 時間を追加
+                        timestamp=len(st.session_state.actions)
+                    )
+                    add_action(action)
+                    st.success(f"文字「{content}」を記録しました")
                     st.rerun()
 
-            elif action_type == "関連付ける":
-                st.subheader("関連付け")
-                coord_options = get_grid_coordinates()
-                start_coord = st.selectbox("開始座標", coord_options, key="rel_start")
-                end_coord = st.selectbox("終了座標", coord_options, key="rel_end")
-                color = st.color_picker("矢印の色", "#FFD93D")
-                
-                # 時間入力を追加
-                default_time = len(st.session_state.actions)
-                time_input = st.number_input("時間（秒）", min_value=0.0, value=float(default_time), step=0.1)
-                
-                if st.button("関連付けを記録"):
-                    start_x, start_y = parse_coordinates(start_coord)
-                    end_x, end_y = parse_coordinates(end_coord)
-                    
-                    action = {
-                        'action_id': len(st.session_state.actions),
-                        'type': '関連付ける',
-                        'start_x': start_x,
-                        'start_y': start_y,
-                        'end_x': end_x,
-                        'end_y': end_y,
-                        'color': color,
-                        'time': time_input,
-                        'timestamp': len(st.session_state.actions)
-                    }
-                    st.session_state.actions.append(action)
-                    st.success("関連付けを記録しました")
-                    st.rerun()
+        elif action_type == "消す（よける）":
+            st.subheader("消去")
             
-            elif action_type == "貼る":
-                st.subheader("貼り付け")
-                coord_options = get_grid_coordinates()
-                start_coord = st.selectbox("開始座標", coord_options, key="paste_start")
-                end_coord = st.selectbox("終了座標", coord_options, key="paste_end")
-                
-                # 画像アップロード機能
-                uploaded_image = st.file_uploader("教材画像（オプション）", type=['png', 'jpg', 'jpeg', 'gif'], key="paste_image")
-                
-                # 代替表示の設定
-                bg_color = st.color_picker("背景色", "#FFFFFF")
-                border_color = st.color_picker("枠線色", "#000000")
-                
-                # ラベル（何を貼ったかの説明）
-                label = st.text_input("ラベル（何を貼ったか）", placeholder="例：プリント、写真、図表など")
+            # 消去可能なアクションを表示（選択肢は他の記録者の追記で位置が変わらない識別子）
+            available_actions = []
+            for action in st.session_state.actions:
+                if action.type != '消す（よける）' and action.action_id not in st.session_state.erased_actions:
+                    uid = action_uid(action)
+                    if action.type == '書く':
+                        available_actions.append((uid, f"文字「{action.content}」({action.start_x},{action.start_y})"))
+                    elif action.type == '線を引く':
+                        available_actions.append((uid, f"線 ({action.start_x},{action.start_y})→({action.end_x},{action.end_y})"))
+                    elif action.type == '囲う':
+                        available_actions.append((uid, f"囲み ({action.start_x},{action.start_y})→({action.end_x},{action.end_y})"))
+                    elif action.type == '関連付ける':
+                        available_actions.append((uid, f"関連付け ({action.start_x},{action.start_y})→({action.end_x},{action.end_y})"))
+                    elif action.type == '貼る':
+                        available_actions.append((uid, f"貼り付け「{action.label}」({action.start_x},{action.start_y})→({action.end_x},{action.end_y})"))
+            
+            if available_actions:
+                descriptions = dict(available_actions)
+                options = list(descriptions)
+                # 選択肢が変わると選択が初期化されるため、前回選んだ対象を選び直す
+                remembered = st.session_state.get('erase_target')
+                selected_uid = st.selectbox("消去するオブジェクト", 
+                                            options=options,
+                                            index=options.index(remembered) if remembered in descriptions else 0,
+                                            format_func=descriptions.get)
+                st.session_state.erase_target = selected_uid
                 
-                # 時間入力を追加
-                default_time = len(st.session_state.actions)
-                time_input = st.number_input("時間（秒）", min_value=0.0, value=float(default_time), step=0.1)
+                time_input = record_time_input()
                 
-                if st.button("貼り付けを記録"):
-                    start_x, start_y = parse_coordinates(start_coord)
-                    end_x, end_y = parse_coordinates(end_coord)
-                    
-                    # 画像データの処理
-                    image_id = None
-                    if uploaded_image is not None:
-                        image_id = f"image_{len(st.session_state.actions)}"
-                        # 画像データをbase64エンコードして保存
-                        import base64
-                        image_data = base64.b64encode(uploaded_image.read()).decode()
-                        st.session_state.uploaded_images[image_id] = {
-                            'data': image_data,
-                            'type': uploaded_image.type,
-                            'name': uploaded_image.name
-                        }
-                    
-                    action = {
-                        'action_id': len(st.session_state.actions),
-                        'type': '貼る',
-                        'start_x': start_x,
-                        'start_y': start_y,
-                        'end_x': end_x,
-                        'end_y': end_y,
-                        'bg_color': bg_color,
-                        'border_color': border_color,
-                        'label': label,
-                        'image_id': image_id,
-                        'time': time_input,
-                        'timestamp': len(st.session_state.actions)
-                    }
-                    st.session_state.actions.append(action)
-                    st.success(f"貼り付け「{label}」を記録しました")
+                if st.button("消去を記録"):
+                    # 記録する時点の位置（action_id）に変換
+                    target_action_id = next(a.action_id for a in st.session_state.actions if action_uid(a) == selected_uid)
+                    action = EraseAction(
+                        action_id=len(st.session_state.actions),
+                        target_action_id=target_action_id,
+                        time=time_input,
+                        timestamp=len(st.session_state.actions)
+                    )
+                    add_action(action)
+                    st.success("消去を記録しました")
                     st.rerun()
-        
-        with col2:
-            st.subheader("現在の板書状態")
-            if st.session_state.actions:
-                blackboard_html = create_blackboard_html(st.session_state.actions)
-                st.components.v1.html(blackboard_html, height=GRID_HEIGHT * CELL_SIZE + 100)
             else:
-                empty_html = create_blackboard_html([])
-                st.components.v1.html(empty_html, height=GRID_HEIGHT * CELL_SIZE + 100)
-            
-            # アクション履歴
-            if st.session_state.actions:
-                st.subheader("記録されたアクション")
-                
-                # 削除確認用のセッション状態
-                if 'delete_confirm' not in st.session_state:
-                    st.session_state.delete_confirm = {}
-                
-                for i, action in enumerate(st.session_state.actions):
-                    col_text, col_delete = st.columns([4, 1])
-                    
-                    with col_text:
-                        if action['type'] == '書く':
-                            st.write(f"{i+1}. 文字「{action['content']}」({action['start_x']},{action['start_y']})→({action['end_x']},{action['end_y']}) [{action['direction']}] (Time: {action.get('time', action['timestamp'])})")
-                        elif action['type'] == '消す（よける）':
-                            st.write(f"{i+1}. 消去 (Action ID: {action['target_action_id']}) (Time: {action.get('time', action['timestamp'])})")
-                        elif action['type'] == '線を引く':
-                            st.write(f"{i+1}. 線 ({action['start_x']},{action['start_y']})→({action['end_x']},{action['end_y']}) (Time: {action.get('time', action['timestamp'])})")
-                        elif action['type'] == '囲う':
-                            st.write(f"{i+1}. 囲み ({action['start_x']},{action['start_y']})→({action['end_x']},{action['end_y']}) (Time: {action.get('time', action['timestamp'])})")
-                        elif action['type'] == '関連付ける':
-                            st.write(f"{i+1}. 関連付け ({action['start_x']},{action['start_y']})→({action['end_x']},{action['end_y']}) (Time: {action.get('time', action['timestamp'])})")
-                        elif action['type'] == '貼る':
-                            st.write(f"{i+1}. 貼り付け「{action['label']}」({action['start_x']},{action['start_y']})→({action['end_x']},{action['end_y']}) (Time: {action.get('time', action['timestamp'])})")
-                    
-                    with col_delete:
-                        # 削除確認状態をチェック
-                        confirm_key = f"confirm_delete_{i}"
-                        if st.session_state.delete_confirm.get(confirm_key, False):
-                            # 確認状態：本当に削除するかの最終確認
-                            if st.button("本当に削除", key=f"really_delete_{i}", type="primary"):
-                                # アクションを削除
-                                deleted_action = st.session_state.actions.pop(i)
-                                
-                                # action_idを再割り当て
-                                for j, act in enumerate(st.session_state.actions):
-                                    act['action_id'] = j
-                                
-                                # 削除されたアクションを参照している消去アクションも削除
-                                st.session_state.actions = [
-                                    act for act in st.session_state.actions 
-                                    if not (act['type'] == '消す（よける）' and act.get('target_action_id') == deleted_action.get('action_id'))
-                                ]
-                                
-                                # 確認状態をリセット
-                                st.session_state.delete_confirm[confirm_key] = False
-                                st.success(f"アクション {i+1} を削除しました")
-                                st.rerun()
-                            
-                            if st.button("キャンセル", key=f"cancel_delete_{i}"):
-                                st.session_state.delete_confirm[confirm_key] = False
-                                st.rerun()
-                        else:
-                            # 通常状態：削除ボタン
-                            if st.button("🗑️", key=f"delete_{i}", help="この記録を削除"):
-                                st.session_state.delete_confirm[confirm_key] = True
-                                st.rerun()
-    
-    with tab2:
-        st.header("板書再現")
-        
-        if not st.session_state.actions:
-            st.warning("記録されたアクションがありません。まず板書記録タブでアクションを記録してください。")
-            return
-        
-        max_time = max([action.get('time', action['timestamp']) for action in st.session_state.actions])
-        
-        if max_time >= 0:
-            # 再生制御
-            col1, col2, col3, col4, col5 = st.columns(5)
+                st.info("消去可能なオブジェクトがありません")
+
+        elif action_type == "線を引く":
+            st.subheader("線描画")
+            coord_options = get_grid_coordinates()
+            start_coord = st.selectbox("開始座標", coord_options, key="line_start")
+            end_coord = st.selectbox("終了座標", coord_options, key="line_end")
+            color = st.color_picker("線の色", "#FFFFFF")
+            thickness = st.slider("線の太さ", 1, 10, 2)
             
-            with col1:
-                if st.button("▶️ 再生"):
-                    st.session_state.is_playing = True
+            # 時間入力を追加
+            time_input = record_time_input()
             
-            with col2:
-                if st.button("⏸️ 一時停止"):
-                    st.session_state.is_playing = False
+            if st.button("線を記録"):
+                start_x, start_y = parse_coordinates(start_coord)
+                end_x, end_y = parse_coordinates(end_coord)
+                
+                action = LineAction(
+                    action_id=len(st.session_state.actions),
+                    start_x=start_x,
+                    start_y=start_y,
+                    end_x=end_x,
+                    end_y=end_y,
+                    color=color,
+                    thickness=thickness,
+                    time=time_input,
+                    timestamp=len(st.session_state.actions)
+                )
+                add_action(action)
+                st.success("線を記録しました")
+                st.rerun()
+
+        elif action_type == "囲う":
+            st.subheader("囲み")
+            coord_options = get_grid_coordinates()
+            start_coord = st.selectbox("開始座標", coord_options, key="box_start")
+            end_coord = st.selectbox("終了座標", coord_options, key="box_end")
+            color = st.color_picker("囲みの色", "#FFFF00")
             
-            with col3:
-                if st.button("⏹️ 停止"):
-                    st.session_state.is_playing = False
-                    st.session_state.current_time = 0
+            # 時間入力を追加
+            time_input = record_time_input()
             
-            with col4:
-                st.session_state.playback_speed = st.selectbox("再生速度", [0.5, 1.0, 1.5, 2.0], index=1)
+            if st.button("囲みを記録"):
+                start_x, start_y = parse_coordinates(start_coord)
+                end_x, end_y = parse_coordinates(end_coord)
+                
+                action = EncloseAction(
+                    action_id=len(st.session_state.actions),
+                    start_x=start_x,
+                    start_y=start_y,
+                    end_x=end_x,
+                    end_y=end_y,
+                    color=color,
+                    time=time_input,
+                    timestamp=len(st.session_state.actions)
+                )
+                add_action(action)
+                st.success("囲みを記録しました")
+                st.rerun()
+
+        elif action_type == "関連付ける":
+            st.subheader("関連付け")
+            coord_options = get_grid_coordinates()
+            start_coord = st.selectbox("開始座標", coord_options, key="rel_start")
+            end_coord = st.selectbox("終了座標", coord_options, key="rel_end")
+            color = st.color_picker("矢印の色", "#FFD93D")
             
-            with col5:
-                if st.button("🔄 リセット"):
-                    st.session_state.current_time = 0
-                    st.session_state.is_playing = False
+            # 時間入力を追加
+            time_input = record_time_input()
             
-            # タイムスライダー
-            playback_time = st.slider("再生時刻", 0.0, float(max_time), float(st.session_state.current_time), step=0.1)
-            st.session_state.current_time = playback_time
+            if st.button("関連付けを記録"):
+                start_x, start_y = parse_coordinates(start_coord)
+                end_x, end_y = parse_coordinates(end_coord)
+                
+                action = RelateAction(
+                    action_id=len(st.session_state.actions),
+                    start_x=start_x,
+                    start_y=start_y,
+                    end_x=end_x,
+                    end_y=end_y,
+                    color=color,
+                    time=time_input,
+                    timestamp=len(st.session_state.actions)
+                )
+                add_action(action)
+                st.success("関連付けを記録しました")
+                st.rerun()
+        
+        elif action_type == "貼る":
+            st.subheader("貼り付け")
+            coord_options = get_grid_coordinates()
+            start_coord = st.selectbox("開始座標", coord_options, key="paste_start")
+            end_coord = st.selectbox("終了座標", coord_options, key="paste_end")
             
-            # 板書表示
-            blackboard_html = create_blackboard_html(st.session_state.actions, st.session_state.current_time)
-            st.components.v1.html(blackboard_html, height=GRID_HEIGHT * CELL_SIZE + 100)
+            # 画像アップロード機能
+            uploaded_image = st.file_uploader("教材画像（オプション）", type=['png', 'jpg', 'jpeg', 'gif'], key="paste_image")
             
-            # タイムライン表示
-            st.subheader("タイムライン")
-            timeline_data = []
-            for i, action in enumerate(st.session_state.actions):
-                timeline_data.append({
-                    'Time': action.get('time', action['timestamp']),
-                    'Action': f"{action['type']} - {action.get('content', 'N/A')}",
-                    'Type': action['type']
-                })
+            # 代替表示の設定
+            bg_color = st.color_picker("背景色", "#FFFFFF")
+            border_color = st.color_picker("枠線色", "#000000")
             
-            if timeline_data:
-                df_timeline = pd.DataFrame(timeline_data)
-                fig = px.scatter(df_timeline, x='Time', y='Action', color='Type', 
-                               title="アクションタイムライン")
-                fig.add_vline(x=st.session_state.current_time, line_dash="dash", line_color="red")
-                st.plotly_chart(fig, use_container_width=True)
+            # ラベル（何を貼ったかの説明）
+            label = st.text_input("ラベル（何を貼ったか）", placeholder="例：プリント、写真、図表など")
             
-            # 授業記録との同期表示
-            if st.session_state.lecture_records is not None:
-                st.subheader("授業記録（現在時刻周辺）")
-                try:
-                    # CSVファイルの列名を確認
-                    if '時刻' in st.session_state.lecture_records.columns:
-                        time_col = '時刻'
-                    elif 'time' in st.session_state.lecture_records.columns:
-                        time_col = 'time'
-                    elif 'Time' in st.session_state.lecture_records.columns:
-                        time_col = 'Time'
-                    else:
-                        time_col = st.session_state.lecture_records.columns[0]  # 最初の列を時刻として使用
-                    
-                    current_records = st.session_state.lecture_records[
-                        (st.session_state.lecture_records[time_col] <= st.session_state.current_time + 5) &
-                        (st.session_state.lecture_records[time_col] >= st.session_state.current_time - 5)
-                    ]
-                    if not current_records.empty:
-                        st.dataframe(current_records)
-                except Exception as e:
-                    st.warning(f"授業記録の表示でエラーが発生しました: {e}")
-                    st.dataframe(st.session_state.lecture_records.head())
+            # 時間入力を追加
+            time_input = record_time_input()
             
-            # 自動再生
-            if st.session_state.is_playing and st.session_state.current_time < max_time:
-                time.sleep(0.1)  # 0.1秒間隔で更新
-                st.session_state.current_time += 0.1 * st.session_state.playback_speed
+            if st.button("貼り付けを記録"):
+                start_x, start_y = parse_coordinates(start_coord)
+                end_x, end_y = parse_coordinates(end_coord)
+                
+                # 画像データの処理
+                image_id = None
+                if uploaded_image is not None:
+                    image_id = f"image_{len(st.session_state.actions)}"
+                    # 画像データをbase64エンコードして保存
+                    import base64
+                    image_data = base64.b64encode(uploaded_image.read()).decode()
+                    st.session_state.uploaded_images[image_id] = {
+                        'data': image_data,
+                        'type': uploaded_image.type,
+                        'name': uploaded_image.name
+                    }
+                
+                action = PasteAction(
+                    action_id=len(st.session_state.actions),
+                    start_x=start_x,
+                    start_y=start_y,
+                    end_x=end_x,
+                    end_y=end_y,
+                    bg_color=bg_color,
+                    border_color=border_color,
+                    label=label,
+                    image_id=image_id,
+                    time=time_input,
+                    timestamp=len(st.session_state.actions)
+                )
+                add_action(action)
+                st.success(f"貼り付け「{label}」を記録しました")
                 st.rerun()
     
-    with tab3:
-        st.header("データ管理")
+    with col2:
+        st.subheader("現在の板書状態")
+        blackboard_board(get_board_timeline().visible_items(), key="record_board")
+        
+        # アクション履歴
+        if st.session_state.actions:
+            st.subheader("記録されたアクション")
+            render_action_history()
+
+def get_history_table():
+    """アクション履歴の表（データが変わるまでキャッシュ）"""
+    import pandas as pd
+    cache = st.session_state.history_table
+    if cache is None or cache['version'] != st.session_state.data_version:
+        actions = st.session_state.actions
+        table = pd.DataFrame({
+            'No.': range(1, len(actions) + 1),
+            'タイプ': [action.type for action in actions],
+            '時間': [action.time for action in actions],
+            '内容': [describe_action(action) for action in actions],
+        })
+        cache = {'version': st.session_state.data_version, 'table': table}
+        st.session_state.history_table = cache
+        # 削除等で行が変わったら選択を解除
+        st.session_state.history_selected = set()
+    return cache['table']
+
+def render_action_history():
+    """アクション履歴（絞り込み・ページ送り・まとめて削除）"""
+    table = get_history_table()
+    selected = st.session_state.history_selected
     
-        # 起動時の読み込み機能を最上部に配置
-        st.subheader("🚀 作業開始")
-        st.write("保存した板書記録から作業を再開できます")
+    # 絞り込み
+    col_type, col_time, col_text = st.columns([2, 2, 2])
+    with col_type:
+        type_filter = st.multiselect("タイプ", sorted(table['タイプ'].unique()), key="history_types")
+    with col_time:
+        max_time = float(table['時間'].max())
+        time_range = st.slider("時間の範囲", 0.0, max(max_time, 0.1), (0.0, max(max_time, 0.1)), step=0.1, key="history_time")
+    with col_text:
+        text_filter = st.text_input("内容で検索", key="history_text")
     
-        # 読み込みモードの選択
-        load_mode = st.radio(
-            "読み込みモード",
-            ["新規読み込み（現在のデータを置き換え）", "追加読み込み（現在のデータに追加）"],
-            help="新規読み込み：保存したデータで完全に置き換え\n追加読み込み：現在の作業に保存したデータを追加"
-        )
+    mask = table['時間'].between(*time_range)
+    if type_filter:
+        mask &= table['タイプ'].isin(type_filter)
+    if text_filter:
+        mask &= table['内容'].str.contains(text_filter, regex=False)
+    filtered = table[mask]
+    
+    # ページ送り（表示するページの行だけを描画）
+    col_size, col_page, col_info = st.columns([1, 1, 2])
+    with col_size:
+        page_size = st.selectbox("表示件数", [20, 50, 100, 200], key="history_page_size")
+    page_count = max((len(filtered) - 1) // page_size + 1, 1)
+    with col_page:
+        page = st.number_input("ページ", min_value=1, max_value=page_count, value=1, step=1, key="history_page")
+    with col_info:
+        st.caption(f"{len(filtered)}件中 {(page - 1) * page_size + 1 if len(filtered) else 0}〜{min(page * page_size, len(filtered))}件目"
+                   f"（全{len(table)}件、{len(selected)}件選択中）")
+    page_rows = filtered.iloc[(page - 1) * page_size:page * page_size]
+    
+    page_view = page_rows.assign(選択=page_rows.index.isin(list(selected)))
+    edited = st.data_editor(
+        page_view,
+        column_order=['選択', 'No.', 'タイプ', '時間', '内容'],
+        disabled=['No.', 'タイプ', '時間', '内容'],
+        hide_index=True,
+        use_container_width=True,
+        key=f"history_editor_{st.session_state.data_version}_{page}_{page_size}_{hash((tuple(type_filter), time_range, text_filter))}",
+    )
+    selected.difference_update(page_rows.index)
+    selected.update(edited.index[edited['選択']])
+    
+    # まとめて選択・削除
+    col_all, col_clear, col_delete = st.columns(3)
+    with col_all:
+        if st.button("絞り込み結果をすべて選択"):
+            selected.update(filtered.index)
+            st.rerun()
+    with col_clear:
+        if st.button("選択を解除", disabled=not selected):
+            selected.clear()
+            st.rerun()
+    with col_delete:
+        if st.session_state.delete_confirm and selected:
+            # 確認状態：本当に削除するかの最終確認
+            if st.button(f"本当に{len(selected)}件を削除", type="primary"):
+                count = len(selected)
+                remove_actions(sorted(selected))
+                st.session_state.delete_confirm = False
+                st.success(f"{count}件のアクションを削除しました")
+                st.rerun()
+            if st.button("キャンセル", key="cancel_delete"):
+                st.session_state.delete_confirm = False
+                st.rerun()
+        else:
+            if st.button(f"🗑️ 選択した{len(selected)}件を削除", disabled=not selected):
+                st.session_state.delete_confirm = True
+                st.rerun()
+
+def render_playback_view():
+    """板書再現画面"""
+    st.header("板書再現")
     
-        uploaded_file = st.file_uploader("📁 板書データファイル（JSON）を選択", type=['json'], key="load_data_file")
+    if not st.session_state.actions:
+        st.warning("記録されたアクションがありません。まず板書記録タブでアクションを記録してください。")
+        return
     
-        if uploaded_file is not None:
+    timeline = get_board_timeline()
+    max_time = timeline.max_time
+    
+    if max_time >= 0:
+        # 再生制御
+        col1, col2, col3, col4, col5 = st.columns(5)
+        
+        with col1:
+            if st.button("▶️ 再生"):
+                st.session_state.is_playing = True
+        
+        with col2:
+            if st.button("⏸️ 一時停止"):
+                st.session_state.is_playing = False
+        
+        with col3:
+            if st.button("⏹️ 停止"):
+                st.session_state.is_playing = False
+                st.session_state.current_time = 0
+        
+        with col4:
+            st.session_state.playback_speed = st.selectbox("再生速度", [0.5, 1.0, 1.5, 2.0], index=1)
+        
+        with col5:
+            if st.button("🔄 リセット"):
+                st.session_state.current_time = 0
+                st.session_state.is_playing = False
+        
+        # タイムスライダー
+        playback_time = st.slider("再生時刻", 0.0, float(max_time), float(st.session_state.current_time), step=0.1)
+        st.session_state.current_time = playback_time
+        
+        # 板書表示（事前に作った索引から現在時刻の状態を求め、変わった部分だけを送る）
+        blackboard_board(timeline.visible_items(st.session_state.current_time), key="playback_board")
+        
+        # タイムライン表示
+        st.subheader("タイムライン")
+        timeline_data = []
+        for i, action in enumerate(st.session_state.actions):
+            timeline_data.append({
+                'Time': action.time,
+                'Action': f"{action.type} - {action.content if action.type == '書く' else 'N/A'}",
+                'Type': action.type
+            })
+        
+        if timeline_data:
+            import pandas as pd
+            import plotly.express as px
+            df_timeline = pd.DataFrame(timeline_data)
+            fig = px.scatter(df_timeline, x='Time', y='Action', color='Type', 
+                           title="アクションタイムライン")
+            fig.add_vline(x=st.session_state.current_time, line_dash="dash", line_color="red")
+            st.plotly_chart(fig, use_container_width=True)
+        
+        # 授業記録との同期表示
+        if st.session_state.lecture_records is not None:
+            st.subheader("授業記録（現在時刻周辺）")
+            from transcript import find_time_column, latest_row_at, to_seconds
             try:
-                # ファイル内容をプレビュー
-                data = json.load(uploaded_file)
-            
-                st.write("**📋 ファイル内容プレビュー**")
-                metadata = data.get('metadata', {})
+                # CSVファイルの列名を確認（00:01:23 形式の時刻も対応表と同じく秒にそろえる）
+                time_col = find_time_column(st.session_state.lecture_records)
+                record_seconds = to_seconds(st.session_state.lecture_records[time_col])
+                
+                current_records = st.session_state.lecture_records[
+                    (record_seconds <= st.session_state.current_time + 5) &
+                    (record_seconds >= st.session_state.current_time - 5)
+                ]
+                if not current_records.empty:
+                    st.dataframe(current_records)
+            except Exception as e:
+                st.warning(f"授業記録の表示でエラーが発生しました: {e}")
+                st.dataframe(st.session_state.lecture_records.head())
             
-                col_info1, col_info2, col_info3 = st.columns(3)
-                with col_info1:
-                    st.metric("アクション数", len(data.get('actions', [])))
-                with col_info2:
-                    st.metric("画像数", len(data.get('images', {})))
-                with col_info3:
-                    created_at = metadata.get('created_at', 'N/A')
-                    if created_at != 'N/A':
-                        try:
-                            created_date = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                            st.metric("作成日時", created_date.strftime('%Y/%m/%d %H:%M'))
-                        except:
-                            st.metric("作成日時", created_at)
+            # 板書と発話の対応（全アクションを一度に結合した表を使い回す）
+            st.subheader("板書と発話の対応")
+            col_tol, col_dir = st.columns(2)
+            with col_tol:
+                tolerance = st.number_input("対応付ける最大の時間差（秒）", min_value=0.0, value=5.0, step=1.0, key="join_tolerance")
+            with col_dir:
+                join_mode = st.radio("対応付け方", ["直前の発話", "最も近い発話"], horizontal=True, key="join_mode")
+            try:
+                joined, joined_csv = get_transcript_join(tolerance, 'backward' if join_mode == "直前の発話" else 'nearest')
+            except Exception as e:
+                st.warning(f"板書と授業記録の対応付けでエラーが発生しました: {e}")
+            else:
+                latest = latest_row_at(joined, st.session_state.current_time)
+                if latest is not None:
+                    st.write("**現在時刻までの最新アクションと対応する発話**")
+                    st.dataframe(latest.to_frame().T, hide_index=True)
+                if st.session_state.is_playing and st.session_state.current_time < max_time:
+                    # 全体の表とCSVは授業の長さに比例して重いので、再生中のコマごとには送らない
+                    st.caption("対応表（全アクション）とCSVのダウンロードは一時停止中に表示します")
+                else:
+                    with st.expander("対応表（全アクション）"):
+                        st.dataframe(joined, hide_index=True)
+                        st.download_button(
+                            label="📥 対応表をCSVでダウンロード",
+                            data=joined_csv,
+                            file_name="blackboard_transcript.csv",
+                            mime="text/csv"
+                        )
+        
+        # 自動再生
+        if st.session_state.is_playing and st.session_state.current_time < max_time:
+            time.sleep(0.1)  # 0.1秒間隔で更新
+            st.session_state.current_time += 0.1 * st.session_state.playback_speed
+            st.rerun()
+
+def render_data_view():
+    """データ管理画面"""
+    st.header("データ管理")
+
+    # 起動時の読み込み機能を最上部に配置
+    st.subheader("🚀 作業開始")
+    st.write("保存した板書記録から作業を再開できます")
+
+    # 読み込みモードの選択
+    load_mode = st.radio(
+        "読み込みモード",
+        ["新規読み込み（現在のデータを置き換え）", "追加読み込み（現在のデータに追加）"],
+        help="新規読み込み：保存したデータで完全に置き換え\n追加読み込み：現在の作業に保存したデータを追加"
+    )
+
+    uploaded_file = st.file_uploader("📁 板書データファイル（JSON）を選択", type=['json'], key="load_data_file")
+
+    if uploaded_file is not None:
+        try:
+            # ファイル内容をプレビュー
+            data = json.load(uploaded_file)
+            # 読み込み時にファイル全体を検証し、アクションに変換
+            loaded_actions, loaded_images = load_save_data(data)
+        
+            st.write("**📋 ファイル内容プレビュー**")
+            metadata = data.get('metadata', {})
+        
+            col_info1, col_info2, col_info3 = st.columns(3)
+            with col_info1:
+                st.metric("アクション数", len(loaded_actions))
+            with col_info2:
+                st.metric("画像数", len(loaded_images))
+            with col_info3:
+                created_at = metadata.get('created_at', 'N/A')
+                if created_at != 'N/A':
+                    try:
+                        created_date = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+                        st.metric("作成日時", created_date.strftime('%Y/%m/%d %H:%M'))
+                    except:
+                        st.metric("作成日時", created_at)
+                else:
+                    st.metric("作成日時", "N/A")
+        
+            # アクションの詳細プレビュー
+            if loaded_actions:
+                st.write("**📝 アクション一覧（最初の5件）**")
+                preview_actions = loaded_actions[:5]
+                for i, action in enumerate(preview_actions):
+                    if action.type == '書く':
+                        st.write(f"{i+1}. 文字「{action.content}」")
+                    elif action.type == '貼る':
+                        st.write(f"{i+1}. 貼り付け「{action.label}」")
                     else:
-                        st.metric("作成日時", "N/A")
+                        st.write(f"{i+1}. {action.type}")
             
-                # アクションの詳細プレビュー
-                if data.get('actions'):
-                    st.write("**📝 アクション一覧（最初の5件）**")
-                    preview_actions = data['actions'][:5]
-                    for i, action in enumerate(preview_actions):
-                        if action['type'] == '書く':
-                            st.write(f"{i+1}. 文字「{action['content']}」")
-                        elif action['type'] == '貼る':
-                            st.write(f"{i+1}. 貼り付け「{action.get('label', 'N/A')}」")
-                        else:
-                            st.write(f"{i+1}. {action['type']}")
-                
-                    if len(data['actions']) > 5:
-                        st.write(f"...他 {len(data['actions']) - 5} 件")
+                if len(loaded_actions) > 5:
+                    st.write(f"...他 {len(loaded_actions) - 5} 件")
+        
+            # 読み込み確認
+            if load_mode.startswith("新規読み込み"):
+                if st.session_state.actions:
+                    st.warning("⚠️ 現在の作業内容が削除されます。事前に保存することをお勧めします。")
             
-                # 読み込み確認
-                if load_mode.startswith("新規読み込み"):
-                    if st.session_state.actions:
-                        st.warning("⚠️ 現在の作業内容が削除されます。事前に保存することをお勧めします。")
+                if st.button("🔄 新規読み込み実行", type="primary", disabled=st.session_state.shared is not None,
+                             help="共同記録中は使えません（追加読み込みを使ってください）" if st.session_state.shared is not None else None):
+                    # 現在のデータをクリア
+                    st.session_state.actions = []
+                    st.session_state.uploaded_images = {}
+                    st.session_state.current_time = 0
+                    st.session_state.is_playing = False
                 
-                    if st.button("🔄 新規読み込み実行", type="primary"):
-                        # 現在のデータをクリア
-                        st.session_state.actions = []
-                        st.session_state.uploaded_images = {}
-                        st.session_state.current_time = 0
-                        st.session_state.is_playing = False
-                    
-                        # 新しいデータを読み込み
-                        st.session_state.actions = data['actions']
-                    
-                        # 画像データがある場合は復元
-                        if 'images' in data:
-                            st.session_state.uploaded_images = data['images']
-                    
-                        st.success(f"✅ データを読み込みました！（{len(data['actions'])}件のアクション）")
-                        st.balloons()
-                        time.sleep(1)
-                        st.rerun()
-            
-                else:  # 追加読み込み
-                    current_count = len(st.session_state.actions)
-                    new_count = len(data['actions'])
+                    # 新しいデータを読み込み
+                    st.session_state.actions = loaded_actions
                 
-                    if st.button("➕ 追加読み込み実行", type="primary"):
-                        # action_idを調整して追加
-                        for action in data['actions']:
-                            action['action_id'] = len(st.session_state.actions)
-                            action['timestamp'] = len(st.session_state.actions)
-                            st.session_state.actions.append(action)
-                    
-                        # 画像データを追加
-                        if 'images' in data:
-                            for img_id, img_data in data['images'].items():
-                                # 重複を避けるため新しいIDを生成
-                                new_img_id = f"imported_{img_id}_{len(st.session_state.uploaded_images)}"
-                                st.session_state.uploaded_images[new_img_id] = img_data
-                            
-                                # アクション内の画像IDも更新
-                                for action in st.session_state.actions:
-                                    if action.get('image_id') == img_id:
-                                        action['image_id'] = new_img_id
-                    
-                        st.success(f"✅ データを追加しました！（{new_count}件のアクションを追加、合計{len(st.session_state.actions)}件）")
-                        st.balloons()
-                        time.sleep(1)
-                        st.rerun()
-        
-            except json.JSONDecodeError:
-                st.error("❌ JSONファイルの形式が正しくありません")
-            except KeyError as e:
-                st.error(f"❌ 必要なデータが見つかりません: {e}")
-            except Exception as e:
-                st.error(f"❌ ファイル読み込みエラー: {e}")
-    
-        else:
-            st.info("📁 JSONファイルを選択してください")
+                    # 画像データがある場合は復元
+                    st.session_state.uploaded_images = loaded_images
+                    mark_dirty()
+                    save_journal_snapshot()
+                
+                    st.success(f"✅ データを読み込みました！（{len(loaded_actions)}件のアクション）")
+                    st.balloons()
+                    time.sleep(1)
+                    st.rerun()
         
-            # 使用方法の説明
-            with st.expander("💡 使用方法"):
-                st.write("""
-                **新規読み込み**
-                - 保存したデータで現在の作業を完全に置き換えます
-                - 途中で中断した作業を再開する場合に使用
+            else:  # 追加読み込み
+                current_count = len(st.session_state.actions)
+                new_count = len(loaded_actions)
             
-                **追加読み込み**
-                - 保存したデータを現在の作業に追加します
-                - 複数のファイルを統合する場合に使用
-            
-                **注意事項**
-                - 新規読み込みを行う前に、現在の作業を保存することをお勧めします
-                - 画像データも含めて完全に復元されます
-                """)
-    
-        st.divider()
+                if st.button("➕ 追加読み込み実行", type="primary"):
+                    if st.session_state.shared is not None:
+                        # 共同記録中は追加分を共有ストアに追記
+                        merged_actions, merged_images = append_loaded_data(
+                            list(st.session_state.actions), dict(st.session_state.uploaded_images),
+                            loaded_actions, loaded_images
+                        )
+                        st.session_state.shared.record(merged_actions[current_count:], merged_images)
+                        apply_shared_state()
+                    else:
+                        # action_idを調整して追加（画像IDも振り直す）
+                        append_loaded_data(st.session_state.actions, st.session_state.uploaded_images,
+                                           loaded_actions, loaded_images)
+                        mark_dirty()
+                        save_journal_snapshot()
+                
+                    st.success(f"✅ データを追加しました！（{new_count}件のアクションを追加、合計{len(st.session_state.actions)}件）")
+                    st.balloons()
+                    time.sleep(1)
+                    st.rerun()
     
-        # データ保存・管理機能
-        col1, col2 = st.columns(2)
+        except json.JSONDecodeError:
+            st.error("❌ JSONファイルの形式が正しくありません")
+        except ActionValidationError as e:
+            st.error(f"❌ 板書データの内容に誤りがあります（{len(e.errors)}件）\n\n{e}")
+        except KeyError as e:
+            st.error(f"❌ 必要なデータが見つかりません: {e}")
+        except Exception as e:
+            st.error(f"❌ ファイル読み込みエラー: {e}")
+
+    else:
+        st.info("📁 JSONファイルを選択してください")
     
-        with col1:
-            st.subheader("💾 データ保存")
-            if st.session_state.actions:
-                data_to_save = {
-                    'actions': st.session_state.actions,
-                    'images': st.session_state.uploaded_images,  # 画像データも保存
-                    'metadata': {
-                        'total_actions': len(st.session_state.actions),
-                        'created_at': datetime.now().isoformat(),
-                        'grid_size': f"{GRID_WIDTH}x{GRID_HEIGHT}",
-                        'version': '2.0'  # バージョン情報を追加
+        # 使用方法の説明
+        with st.expander("💡 使用方法"):
+            st.write("""
+            **新規読み込み**
+            - 保存したデータで現在の作業を完全に置き換えます
+            - 途中で中断した作業を再開する場合に使用
+        
+            **追加読み込み**
+            - 保存したデータを現在の作業に追加します
+            - 複数のファイルを統合する場合に使用
+        
+            **注意事項**
+            - 新規読み込みを行う前に、現在の作業を保存することをお勧めします
+            - 画像データも含めて完全に復元されます
+            """)
+
+    st.divider()
+
+    # データ保存・管理機能
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.subheader("💾 データ保存")
+        if st.session_state.actions:
+            # JSONの生成はボタンが押されたときだけ行い、データが変わるまで結果を使い回す
+            cache = st.session_state.save_cache
+            if cache is None or cache['version'] != st.session_state.data_version:
+                if st.button("📦 保存用データを準備"):
+                    buffer = io.BytesIO()
+                    dump_save_json(st.session_state.actions, st.session_state.uploaded_images, buffer)
+                    st.session_state.save_cache = {
+                        'version': st.session_state.data_version,
+                        'data': buffer,
+                        'file_name': f"blackboard_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
                     }
-                }
-            
-                json_str = json.dumps(data_to_save, ensure_ascii=False, indent=2)
+                    st.rerun()
+            else:
                 st.download_button(
                     label="📥 板書データをダウンロード",
-                    data=json_str,
-                    file_name=f"blackboard_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                    data=cache['data'],
+                    file_name=cache['file_name'],
                     mime="application/json"
                 )
-            
-                # 現在のデータ情報を表示
-                st.write("**現在のデータ**")
-                st.write(f"- アクション数: {len(st.session_state.actions)}件")
-                st.write(f"- 画像数: {len(st.session_state.uploaded_images)}件")
-            
-            else:
-                st.info("保存するデータがありません")
-                st.write("板書記録タブでアクションを記録してから保存してください。")
+        
+            # 現在のデータ情報を表示
+            st.write("**現在のデータ**")
+            st.write(f"- アクション数: {len(st.session_state.actions)}件")
+            st.write(f"- 画像数: {len(st.session_state.uploaded_images)}件")
+        
+        else:
+            st.info("保存するデータがありません")
+            st.write("板書記録タブでアクションを記録してから保存してください。")
+
+    with col2:
+        st.subheader("🗂️ 現在の作業状況")
+        if st.session_state.actions:
+            # 最新のアクション5件を表示
+            st.write("**最新のアクション（5件）**")
+            recent_actions = st.session_state.actions[-5:]
+            for i, action in enumerate(reversed(recent_actions)):
+                idx = len(st.session_state.actions) - i
+                if action.type == '書く':
+                    st.write(f"{idx}. 文字「{action.content}」")
+                elif action.type == '貼る':
+                    st.write(f"{idx}. 貼り付け「{action.label}」")
+                else:
+                    st.write(f"{idx}. {action.type}")
+        else:
+            st.info("まだアクションが記録されていません")
+            st.write("板書記録タブでアクションを記録してください。")
+
+    # 統計情報
+    if st.session_state.actions:
+        st.subheader("📊 統計情報")
     
+        # アクションタイプ別の集計
+        action_counts = {}
+        for action in st.session_state.actions:
+            action_type = action.type
+            action_counts[action_type] = action_counts.get(action_type, 0) + 1
+    
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("総アクション数", len(st.session_state.actions))
         with col2:
-            st.subheader("🗂️ 現在の作業状況")
-            if st.session_state.actions:
-                # 最新のアクション5件を表示
-                st.write("**最新のアクション（5件）**")
-                recent_actions = st.session_state.actions[-5:]
-                for i, action in enumerate(reversed(recent_actions)):
-                    idx = len(st.session_state.actions) - i
-                    if action['type'] == '書く':
-                        st.write(f"{idx}. 文字「{action['content']}」")
-                    elif action['type'] == '貼る':
-                        st.write(f"{idx}. 貼り付け「{action.get('label', 'N/A')}」")
-                    else:
-                        st.write(f"{idx}. {action['type']}")
-            else:
-                st.info("まだアクションが記録されていません")
-                st.write("板書記録タブでアクションを記録してください。")
+            st.metric("記録時間", f"{len(st.session_state.actions)} ステップ")
+        with col3:
+            most_used = max(action_counts, key=action_counts.get) if action_counts else "なし"
+            st.metric("最多使用アクション", most_used)
     
-        # 統計情報
-        if st.session_state.actions:
-            st.subheader("📊 統計情報")
-        
-            # アクションタイプ別の集計
-            action_counts = {}
-            for action in st.session_state.actions:
-                action_type = action['type']
-                action_counts[action_type] = action_counts.get(action_type, 0) + 1
-        
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("総アクション数", len(st.session_state.actions))
-            with col2:
-                st.metric("記録時間", f"{len(st.session_state.actions)} ステップ")
-            with col3:
-                most_used = max(action_counts, key=action_counts.get) if action_counts else "なし"
-                st.metric("最多使用アクション", most_used)
-        
-            # アクションタイプ分布
-            if action_counts:
-                fig = px.pie(values=list(action_counts.values()), 
-                           names=list(action_counts.keys()), 
-                           title="アクションタイプ分布")
-                st.plotly_chart(fig, use_container_width=True)
+        # アクションタイプ分布
+        if action_counts:
+            import plotly.express as px
+            fig = px.pie(values=list(action_counts.values()), 
+                       names=list(action_counts.keys()), 
+                       title="アクションタイプ分布")
+            st.plotly_chart(fig, use_container_width=True)
+
+def render_compare_view():
+    """比較再現画面"""
+    st.header("比較再現")
+    st.write("複数の板書記録を共通の再生時刻で並べて再現します")
     
+    compare_files = st.file_uploader("📁 比較する板書データファイル（JSON）", type=['json'],
+                                     accept_multiple_files=True, key="compare_files")
+    include_current = st.checkbox("現在の記録も含める", value=bool(st.session_state.actions),
+                                  disabled=not st.session_state.actions)
+    
+    # (表示名, 再生用索引, キー)
+    lectures = []
+    if include_current and st.session_state.actions:
+        lectures.append(("現在の記録", get_board_timeline(), "current"))
+    for uploaded_file in compare_files or []:
+        try:
+            lectures.append((uploaded_file.name, load_compare_timeline(uploaded_file), uploaded_file.file_id))
+        except Exception as e:
+            st.error(f"❌ {uploaded_file.name} の読み込みエラー: {e}")
+    
+    # 選択から外れたファイルの索引を破棄
+    active_ids = {key for _, _, key in lectures}
+    for file_id in list(st.session_state.compare_timelines):
+        if file_id not in active_ids:
+            del st.session_state.compare_timelines[file_id]
+    
+    if not lectures:
+        st.info("📁 比較する板書データファイルを選択してください")
+        return
+    
+    # 授業ごとの時間オフセット（共通時刻 - オフセット = 各授業の時刻）
+    with st.expander("⏱️ 時間オフセット（秒）"):
+        offsets = {
+            key: st.number_input(name, value=0.0, step=1.0, key=f"compare_offset_{key}")
+            for name, _, key in lectures
+        }
+    max_time = max(max(timeline.max_time + offsets[key], 0) for _, timeline, key in lectures)
+    
+    # 再生制御
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        if st.button("▶️ 再生", key="compare_play"):
+            st.session_state.compare_playing = True
+    with col2:
+        if st.button("⏸️ 一時停止", key="compare_pause"):
+            st.session_state.compare_playing = False
+    with col3:
+        if st.button("⏹️ 停止", key="compare_stop"):
+            st.session_state.compare_playing = False
+            st.session_state.compare_time = 0.0
+    with col4:
+        compare_speed = st.selectbox("再生速度", [0.5, 1.0, 1.5, 2.0], index=1, key="compare_speed")
+    
+    # 共通のタイムスライダー
+    st.session_state.compare_time = st.slider(
+        "再生時刻（共通）", 0.0, float(max_time) or 0.1, float(min(st.session_state.compare_time, max_time)), step=0.1
+    )
+    
+    # 板書を2列で並べる
+    for row_start in range(0, len(lectures), 2):
+        columns = st.columns(2)
+        for column, (name, timeline, key) in zip(columns, lectures[row_start:row_start + 2]):
+            local_time = st.session_state.compare_time - offsets[key]
+            with column:
+                st.caption(f"**{name}**（{max(local_time, 0):.1f}秒）")
+                blackboard_board(timeline.visible_items(local_time), key=f"compare_board_{key}")
+    
+    # 自動再生
+    if st.session_state.compare_playing and st.session_state.compare_time < max_time:
+        time.sleep(0.1)  # 0.1秒間隔で更新
+        st.session_state.compare_time += 0.1 * compare_speed
+        st.rerun()
+
+# 表示モードと描画関数の対応
+VIEWS = {
+    "📝 板書記録": render_record_view,
+    "▶️ 板書再現": render_playback_view,
+    "🔀 比較再現": render_compare_view,
+    "📊 データ管理": render_data_view,
+}
+
+def main():
+    st.title("📝 板書記録・再現システム")
+    
+    # 再読み込み・再起動後はURLの保存名から自動保存を復元
+    if st.session_state.journal is None and 'autosave' in st.query_params:
+        autosave_name = st.query_params['autosave']
+        try:
+            start_autosave(autosave_name)
+        except (ValueError, KeyError, TypeError, OSError) as e:  # 検証エラー・壊れたJSONを含む
+            # 壊れた保存のURLで毎回失敗し続けないよう、URLから外す
+            st.query_params.pop('autosave', None)
+            st.error(f"❌ 自動保存「{autosave_name}」を復元できませんでした: {e}")
+    render_autosave_sidebar()
+    
+    # 再読み込み・再起動後はURLの授業名から共同記録に参加し直す
+    if st.session_state.shared is None and 'shared' in st.query_params and 'observer' in st.query_params:
+        join_shared_lecture(st.query_params['shared'], st.query_params['observer'])
+    render_shared_sidebar()
+    
+    # 表示モードの選択（st.tabsは全タブの中身を毎回実行するため、選択中の画面だけを実行する）
+    view = st.radio("表示モード", list(VIEWS.keys()), horizontal=True, key="view_mode", label_visibility="collapsed")
+    VIEWS[view]()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,38 @@
+"""bulk_import の検証（取り込めない値が行エラーになること）"""
+import io
+
+import pytest
+
+from bulk_import import read_action_table, table_to_actions, validate_action_table
+
+HEADER = "type,time,start_x,start_y,end_x,end_y,content,size\n"
+
+
+def _validate(row):
+    df = read_action_table(io.StringIO(HEADER + row + "\n"), "actions.csv")
+    return validate_action_table(df, [])
+
+
+def test_valid_row_is_imported():
+    df, errors = _validate("書く,1.5,0,0,1,1,あ,12")
+    assert errors.empty
+    action, = table_to_actions(df, 0)
+    assert action.time == 1.5 and action.size == 12
+
+
+@pytest.mark.parametrize("value", ["inf", "-inf", "nan", "-1"])
+def test_time_must_be_finite_and_non_negative(value):
+    _, errors = _validate(f"書く,{value},0,0,1,1,あ,12")
+    assert errors[['行', '列']].values.tolist() == [[2, 'time']]
+
+
+@pytest.mark.parametrize("row, column", [
+    ("書く,1,inf,0,1,1,あ,12", 'start_x'),
+    ("書く,1,1e30,0,1,1,あ,12", 'start_x'),
+    ("書く,1,100000000000000000000000000000,0,1,1,あ,12", 'start_x'),
+    ("書く,1,0,0,1,1,あ,inf", 'size'),
+    ("書く,1,0,0,1,1,あ,-1e30", 'size'),
+])
+def test_non_finite_or_huge_integers_are_row_errors(row, column):
+    _, errors = _validate(row)
+    assert errors[['行', '列', '内容']].values.tolist() == [[2, column, "整数で指定してください"]]
@@ -0,0 +1,47 @@
+"""journal の排他（同じ保存名を複数のセッションで使わないこと）"""
+import pytest
+
+from action_model import action_from_dict
+from journal import ActionJournal, JournalInUseError
+
+
+def _write(action_id, content):
+    return action_from_dict({'action_id': action_id, 'type': '書く', 'content': content, 'time': action_id,
+                             'timestamp': action_id, 'start_x': 0, 'start_y': 0, 'end_x': 1, 'end_y': 1})
+
+
+def _contents(directory, name):
+    actions, _ = ActionJournal(directory, name).restore()
+    return [action.content for action in actions]
+
+
+def test_second_session_cannot_acquire(tmp_path):
+    first = ActionJournal(tmp_path, "lec")
+    first.acquire()
+    with pytest.raises(JournalInUseError):
+        ActionJournal(tmp_path, "lec").acquire()
+    first.close()
+    # 閉じればロックは外れる
+    again = ActionJournal(tmp_path, "lec")
+    again.acquire()
+    again.close()
+
+
+def test_fork_keeps_sessions_apart(tmp_path):
+    first = ActionJournal(tmp_path, "lec")
+    first.acquire()
+    first.compact([], {})
+    first.log_add(_write(0, "a"))
+    first.log_add(_write(1, "b"))
+
+    second = ActionJournal(tmp_path, "lec").fork()
+    assert second.name == "lec_2"
+    second.restore()
+    second.log_add(_write(2, "B"))
+    first.log_add(_write(2, "A"))
+    first.log_delete([0])
+    first.close()
+    second.close()
+
+    assert _contents(tmp_path, "lec") == ["b", "A"]
+    assert _contents(tmp_path, "lec_2") == ["a", "b", "B"]
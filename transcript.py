@@ -0,0 +1,65 @@
+"""板書アクションと授業記録（発話）の対応付け
+
+アクションと授業記録をそれぞれ時刻で並べ、pandas.merge_asof で一度に
+結合する（アクションごとの検索ループは行わない）。
+"""
+import pandas as pd
+
+ACTION_COLUMNS = ['action_id', 'type', 'time', 'content', 'label', 'start_x', 'start_y', 'end_x', 'end_y']
+RECORD_PREFIX = "授業記録_"
+
+
+def find_time_column(records):
+    """授業記録の時刻列を推定（時刻 / time / Time、なければ最初の列）"""
+    for name in ('時刻', 'time', 'Time'):
+        if name in records.columns:
+            return name
+    return records.columns[0]
+
+
+def to_seconds(values):
+    """時刻列を秒（float）に変換。数値でなければ 00:01:23 形式として解釈"""
+    seconds = pd.to_numeric(values, errors='coerce')
+    if seconds.isna().all():
+        seconds = pd.to_timedelta(values.astype(str), errors='coerce').dt.total_seconds()
+    return seconds.astype(float)
+
+
+def actions_to_frame(actions):
+    """アクションを時刻順のDataFrameに変換"""
+    # タイプにない項目（書く以外の content など）は空欄
+    frame = pd.DataFrame({column: [getattr(action, column, None) for action in actions] for column in ACTION_COLUMNS})
+    frame['time'] = frame['time'].astype(float)
+    return frame.sort_values('time', kind='stable').reset_index(drop=True)
+
+
+def join_actions_with_records(actions, records, tolerance=5.0, direction='backward'):
+    """各アクションに対応する発話を結合した表を返す
+
+    direction='backward' は直前（同時刻を含む）の発話、'nearest' は前後で最も近い発話。
+    tolerance（秒）より離れた発話は対応付けない（None なら無制限）。
+    """
+    action_frame = actions_to_frame(actions)
+
+    time_col = find_time_column(records)
+    record_frame = records.add_prefix(RECORD_PREFIX)
+    record_time = RECORD_PREFIX + time_col
+    record_frame['_record_time'] = to_seconds(records[time_col]).to_numpy()
+    record_frame = record_frame.dropna(subset=['_record_time']).sort_values('_record_time', kind='stable')
+
+    joined = pd.merge_asof(
+        action_frame, record_frame,
+        left_on='time', right_on='_record_time',
+        direction=direction,
+        tolerance=tolerance,
+    )
+    joined.insert(joined.columns.get_loc(record_time), '発話との時間差', joined['time'] - joined['_record_time'])
+    return joined.drop(columns='_record_time')
+
+
+def latest_row_at(joined, current_time):
+    """current_time までで最後のアクションの行（なければ None）"""
+    position = joined['time'].searchsorted(current_time, side='right')
+    if position == 0:
+        return None
+    return joined.iloc[position - 1]